@@ -0,0 +1,69 @@
+"""
+Gazetteer shared by the order service (address geocoding) and the delivery service
+(offline route estimates), so an address is located the same way by both.
+"""
+import csv
+import re
+import unicodedata
+
+from pathlib import Path
+
+# Polish cities and postcode prefixes, rebuilt by the delivery service's import_gazetteer command
+BUNDLED_PATH = Path(__file__).resolve().parent / 'data' / 'gazetteer_pl.csv'
+
+POSTCODE_RE = re.compile(r'\b(\d{2})-?(\d{3})\b')
+
+# Letters NFKD does not decompose into a base letter and an accent
+EXTRA_LETTERS = str.maketrans({'ł': 'l', 'Ł': 'L'})
+
+
+def normalize_place(name):
+    """Lowercase place name without diacritics, so 'Łódź' and 'lodz' match"""
+    name = unicodedata.normalize('NFKD', name.translate(EXTRA_LETTERS))
+    name = ''.join(char for char in name if not unicodedata.combining(char))
+    return ' '.join(name.lower().split())
+
+
+class Gazetteer:
+    """
+    Coordinates of cities and postcode prefixes, loaded from a CSV with the columns
+    kind (city or postcode), name, latitude, longitude.
+    Postcode prefixes may have any length ('31', '22-4', '31-123'), the longest match wins.
+    """
+
+    def __init__(self, cities=None, postcodes=None):
+        self.cities = cities or {}
+        self.postcodes = postcodes or {}
+
+    @classmethod
+    def from_csv(cls, path):
+        cities, postcodes = {}, {}
+        with open(path, newline='', encoding='utf-8') as file:
+            for row in csv.DictReader(file):
+                point = (float(row['latitude']), float(row['longitude']))
+                if row['kind'] == 'postcode':
+                    postcodes[row['name'].strip()] = point
+                else:
+                    cities[normalize_place(row['name'])] = point
+        return cls(cities, postcodes)
+
+    def geocode(self, address):
+        """Return (latitude, longitude) of a free-text address or None, postcodes are tried before city names"""
+        located = self.locate(address)
+        return located[0] if located else None
+
+    def locate(self, address):
+        """Return ((latitude, longitude), 'postcode' or 'city') of a free-text address or None"""
+        match = POSTCODE_RE.search(address)
+        if match:
+            code = f'{match.group(1)}-{match.group(2)}'
+            for length in (6, 5, 4, 2):
+                point = self.postcodes.get(code[:length])
+                if point:
+                    return point, 'postcode'
+
+        for part in reversed(address.split(',')):
+            point = self.cities.get(normalize_place(part))
+            if point:
+                return point, 'city'
+        return None
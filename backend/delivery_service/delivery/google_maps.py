@@ -1,76 +1,180 @@
 import os
+import threading
 import requests
 from django.conf import settings
+from django.db import close_old_connections
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 
+from .route_cache import RouteCache
+from .routing import get_estimator, stable_distance_km
+
 
 class GoogleMapsService:
     """Service for interacting with Google Maps API"""
     
     BASE_URL = "https://maps.googleapis.com/maps/api/distancematrix/json"
+
+    # Distance Matrix API limit of destinations per request
+    MAX_DESTINATIONS = 25
     
-    def __init__(self):
+    def __init__(self, cache=None, estimator=None):
         self.api_key = settings.GOOGLE_MAPS_API_KEY
+        self.cache = cache if cache is not None else RouteCache()
+        self.estimator = estimator if estimator is not None else get_estimator()
+        self.session = requests.Session()
+
+        # Background API lookups refining routes answered with an estimate
+        self.refiner = ThreadPoolExecutor(max_workers=1, thread_name_prefix='route-refiner')
+        # Routes submitted to the refiner and not stored yet, so repeated misses are not looked up again
+        self._refining = set()
+        self._refining_lock = threading.Lock()
         
         if not self.api_key:
-            print("[WARNING] Google Maps API key not configured. Distance calculation will be simulated.")
+            print("[WARNING] Google Maps API key not configured. Distances will be estimated offline.")
     
-    def calculate_distance(self, origin, destination):
+    def calculate_distance(self, origin, destination, use_cache=True):
+        """
+        Return the driving distance and duration of a route.
+        Routes are served from the route cache when possible, pass use_cache=False
+        (or set ROUTE_CACHE_BYPASS) to always ask the API.
+        """
+        return self.calculate_distances([(origin, destination)], use_cache=use_cache)[0]
+
+    def calculate_distances(self, routes, use_cache=True):
+        """
+        Return the distance and duration of each (origin, destination) pair, in the given order.
+        Cache misses sharing an origin are resolved together, one matrix request per
+        MAX_DESTINATIONS destinations, so a burst of deliveries from one restaurant costs one call.
+        """
+        use_cache = use_cache and not settings.ROUTE_CACHE_BYPASS
+
+        results = [None] * len(routes)
+        missing = {}
+        for index, (origin, destination) in enumerate(routes):
+            route = self.cache.get(origin, destination) if use_cache else None
+            if route is not None:
+                results[index] = {**route, 'status': 'cached'}
+            else:
+                missing.setdefault((origin, destination), []).append(index)
+
+        if not missing:
+            return results
+
+        # Answer from the offline estimate right away and let the API refine the cached route later
+        if use_cache and settings.ROUTE_ESTIMATE_FIRST and self.api_key:
+            estimated = []
+            for route, estimate in zip(list(missing), self.estimator.estimate_many(list(missing))):
+                if estimate is not None:
+                    estimated.append(route)
+                    for index in missing.pop(route):
+                        results[index] = dict(estimate)
+            with self._refining_lock:
+                estimated = [route for route in estimated if route not in self._refining]
+                self._refining.update(estimated)
+            if estimated:
+                self.refiner.submit(self._refine, estimated)
+            if not missing:
+                return results
+
+        for (origin, destination), result in self._request_distances(list(missing)).items():
+            # Only real API answers are cached, fallbacks would otherwise outlive an outage
+            if use_cache and result['status'] == 'success':
+                self.cache.set(origin, destination, result['distance_km'], result['duration_seconds'])
+            for index in missing[(origin, destination)]:
+                results[index] = dict(result)
+
+        return results
+
+    def _refine(self, routes):
+        """Runs on the refiner thread, stores API answers for routes that were estimated"""
+        try:
+            for (origin, destination), result in self._request_distances(routes).items():
+                if result['status'] == 'success':
+                    self.cache.set(origin, destination, result['distance_km'], result['duration_seconds'])
+        except Exception as e:
+            print(f"[ERROR] Route refinement failed: {e}")
+        finally:
+            with self._refining_lock:
+                self._refining.difference_update(routes)
+            close_old_connections()
+
+    def _request_distances(self, routes):
+        """Resolve routes with as few matrix requests as the API limits allow, returns {(origin, destination): result}"""
+        destinations_by_origin = {}
+        for origin, destination in routes:
+            destinations_by_origin.setdefault(origin, []).append(destination)
+
+        # One origin per request, so every billed element is a route we asked for
+        results = {}
+        for origin, destinations in destinations_by_origin.items():
+            for start in range(0, len(destinations), self.MAX_DESTINATIONS):
+                results.update(self._request_matrix(origin, destinations[start:start + self.MAX_DESTINATIONS]))
+        return results
+
+    def _request_matrix(self, origin, destinations):
 
         # If API key is not configured, return simulated data
         if not self.api_key:
-            return self._simulate_distance(origin, destination)
+            return self._simulate_matrix(origin, destinations)
         
         try:
             params = {
                 'origins': origin,
-                'destinations': destination,
+                'destinations': '|'.join(destinations),
                 'key': self.api_key,
                 'units': 'metric',
                 'mode': 'driving',
                 'language': 'pl'
             }
             
-            response = requests.get(self.BASE_URL, params=params, timeout=10)
+            response = self.session.get(self.BASE_URL, params=params, timeout=10)
             response.raise_for_status()
             
             data = response.json()
             
             if data['status'] != 'OK':
                 print(f"[ERROR] Google Maps API error: {data['status']}")
-                return self._simulate_distance(origin, destination)
-            
-            # Extract distance and duration from response
-            element = data['rows'][0]['elements'][0]
+                return self._simulate_matrix(origin, destinations)
             
-            if element['status'] != 'OK':
-                print(f"[ERROR] Route calculation failed: {element['status']}")
-                return self._simulate_distance(origin, destination)
-            
-            distance_meters = element['distance']['value']
-            duration_seconds = element['duration']['value']
-            
-            return {
-                'distance_km': round(distance_meters / 1000, 2),
-                'duration_seconds': duration_seconds,
-                'status': 'success'
-            }
+            # Extract distance and duration of every destination from the single row
+            results = {}
+            for destination, element in zip(destinations, data['rows'][0]['elements'], strict=True):
+                if element['status'] != 'OK':
+                    print(f"[ERROR] Route calculation failed: {element['status']}")
+                    results[(origin, destination)] = self._simulate_distance(origin, destination)
+                    continue
+
+                results[(origin, destination)] = {
+                    'distance_km': round(element['distance']['value'] / 1000, 2),
+                    'duration_seconds': element['duration']['value'],
+                    'status': 'success'
+                }
+
+            return results
             
         except requests.exceptions.RequestException as e:
             print(f"[ERROR] Google Maps API request failed: {e}")
-            return self._simulate_distance(origin, destination)
-        except (KeyError, IndexError) as e:
+            return self._simulate_matrix(origin, destinations)
+        except (KeyError, IndexError, ValueError) as e:
             print(f"[ERROR] Failed to parse Google Maps response: {e}")
-            return self._simulate_distance(origin, destination)
+            return self._simulate_matrix(origin, destinations)
+
+    def _simulate_matrix(self, origin, destinations):
+        return {(origin, destination): self._simulate_distance(origin, destination) for destination in destinations}
     
     def _simulate_distance(self, origin, destination):
         """
-        Simulate distance calculation when API is not available
-        Returns realistic-looking values based on hash of addresses
+        Estimate the route offline when the API is not available.
+        Addresses missing from the gazetteer get a stable pseudo-random distance,
+        the same in every process.
         """
-        # Use hash to get consistent but varied results
-        hash_value = hash(f"{origin}{destination}")
-        distance_km = abs(hash_value % 20) + 2  # 2-22 km
+        estimate = self.estimator.estimate(origin, destination)
+        if estimate is not None:
+            print(f"[ESTIMATED] Distance: {estimate['distance_km']} km, Duration: {estimate['duration_seconds']}s")
+            return estimate
+
+        distance_km = stable_distance_km(origin, destination, 2, 22)
         
         # Assume average speed of 30 km/h in city
         duration_seconds = int((distance_km / 30) * 3600)
@@ -91,3 +195,17 @@ class GoogleMapsService:
         hours = minutes // 60
         remaining_minutes = minutes % 60
         return f"{hours}h {remaining_minutes}min"
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_maps_service():
+    """Return the process wide maps service, so its route cache is shared by every message."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = GoogleMapsService()
+    return _service
@@ -0,0 +1,135 @@
+import asyncio
+import contextlib
+import io
+import json
+import multiprocessing
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from delivery.google_maps import get_maps_service
+from delivery.models import Delivery
+from delivery_consumer.async_consumer import AsyncDeliveryConsumer
+from delivery_consumer.consumer import deliver_order
+from delivery_consumer.order_client import AsyncOrderServiceClient, OrderServiceClient
+
+# Order ids far above real ones, their deliveries are deleted after every run
+FIRST_ORDER_ID = 900_000_000
+CITIES = ['Warszawa', 'Krakow', 'Poznan', 'Gdansk', 'Wroclaw', 'Lodz']
+
+
+class StubOrderServiceHandler(BaseHTTPRequestHandler):
+    """Answers delivery-context requests after the configured latency"""
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are separate writes, Nagle would hold the body back for the delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+
+        order_id = int(self.path.strip('/').split('/')[2])
+        body = json.dumps({
+            'order_id': order_id,
+            'restaurant_address': {'street': 'Rynek', 'house_number': '1', 'city': CITIES[order_id % len(CITIES)]},
+            'customer_address': {'street': 'Benchmark', 'house_number': str(order_id), 'city': CITIES[order_id % 5]},
+        }).encode()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_order_service(port, latency):
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubOrderServiceHandler)
+    server.latency = latency
+    server.serve_forever()
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare deliveries/sec and CPU time of the thread pool and asyncio delivery pipelines against '
+        'a stub Order Service running in a separate process (deliveries are deleted afterwards).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=32, help='Pool workers and async deliveries in flight')
+        parser.add_argument('--workers', type=int, default=8, help='Threads the async pipeline offloads the ORM to')
+        parser.add_argument('--latency', type=float, default=0.05, help='Order Service response time in seconds')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument(
+            '--mode', choices=['both', 'pool', 'async'], default='both',
+            help='The pool needs a database connection per worker, skip it above max_connections',
+        )
+
+    def handle(self, *args, **options):
+        server = multiprocessing.Process(
+            target=serve_order_service, args=(options['port'], options['latency']), daemon=True
+        )
+        server.start()
+        time.sleep(0.5)
+
+        url = f"http://127.0.0.1:{options['port']}"
+        order_ids = range(FIRST_ORDER_ID, FIRST_ORDER_ID + options['messages'])
+
+        try:
+            if options['mode'] in ('both', 'pool'):
+                self.measure('pool', order_ids, lambda: self.run_pool(url, order_ids, options['concurrency']))
+            if options['mode'] in ('both', 'async'):
+                self.measure('async', order_ids, lambda: asyncio.run(
+                    self.run_async(url, order_ids, options['concurrency'], options['workers'])
+                ))
+        finally:
+            server.terminate()
+            server.join()
+
+    def measure(self, label, order_ids, run):
+        Delivery.objects.filter(order_id__in=order_ids).delete()
+        get_maps_service().cache.clear()
+
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        with contextlib.redirect_stdout(io.StringIO()):
+            run()
+        wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+
+        created = Delivery.objects.filter(order_id__in=order_ids).count()
+        Delivery.objects.filter(order_id__in=order_ids).delete()
+
+        self.stdout.write(
+            f'{label:<6} {created} deliveries in {wall:6.2f} s   {created / wall:8.1f} msg/s   '
+            f'CPU {cpu:6.2f} s   {created / cpu:8.1f} msg/CPU-s'
+        )
+
+    def run_pool(self, url, order_ids, concurrency):
+        client = OrderServiceClient(url, pool_size=concurrency)
+
+        def process(order_id):
+            try:
+                return deliver_order(order_id, client)
+            finally:
+                close_old_connections()
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(process, order_ids))
+        client.close()
+
+    async def run_async(self, url, order_ids, concurrency, workers):
+        consumer = AsyncDeliveryConsumer(None, AsyncOrderServiceClient(url, pool_size=concurrency), workers=workers)
+        # Stands in for the channel prefetch limit
+        in_flight = asyncio.Semaphore(concurrency)
+
+        async def process(order_id):
+            async with in_flight:
+                return await consumer.deliver_order(order_id)
+
+        await asyncio.gather(*(process(order_id) for order_id in order_ids))
+        await consumer.close()
@@ -0,0 +1,39 @@
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from delivery.routing import Gazetteer, RouteEstimator
+
+
+class Command(BaseCommand):
+    help = 'Measure the offline route estimator on random city and postcode addresses.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--routes', type=int, default=100_000)
+        parser.add_argument('--addresses', type=int, default=5_000, help='Distinct addresses the routes are drawn from')
+
+    def handle(self, *args, **options):
+        gazetteer = Gazetteer.from_csv(settings.GAZETTEER_PATH)
+        estimator = RouteEstimator(gazetteer)
+        rng = random.Random(42)
+
+        cities = sorted(gazetteer.cities)
+        addresses = [
+            f'Street {i}, {rng.randint(1, 200)}, {rng.choice(cities).title()}, '
+            f'{rng.choice(list(gazetteer.postcodes))[:2]}-{rng.randint(0, 999):03d}, Poland'
+            for i in range(options['addresses'])
+        ]
+        routes = [(rng.choice(addresses), rng.choice(addresses)) for _ in range(options['routes'])]
+
+        for label in ('cold', 'warm'):
+            start = time.perf_counter()
+            results = estimator.estimate_many(routes)
+            elapsed = time.perf_counter() - start
+
+            estimated = sum(result is not None for result in results)
+            self.stdout.write(
+                f'{label}: {len(routes)} routes in {elapsed * 1000:.1f} ms, '
+                f'{elapsed / len(routes) * 1_000_000:.2f} us/route, {estimated} estimated'
+            )
@@ -0,0 +1,38 @@
+import csv
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Build a gazetteer CSV from a GeoNames postal code dump (e.g. PL.txt from '
+        'download.geonames.org/export/zip/), with one row per postcode and per place name.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Tab separated GeoNames postal code file')
+        parser.add_argument('--output', default=settings.GAZETTEER_PATH)
+
+    def handle(self, *args, **options):
+        postcodes, cities = {}, {}
+
+        try:
+            with open(options['source'], newline='', encoding='utf-8') as file:
+                for row in csv.reader(file, delimiter='\t'):
+                    # country, postcode, place, admin1..admin3 names and codes, latitude, longitude, accuracy
+                    postcode, place, latitude, longitude = row[1], row[2], row[9], row[10]
+                    if not latitude or not longitude:
+                        continue
+                    postcodes.setdefault(postcode, (latitude, longitude))
+                    cities.setdefault(place, (latitude, longitude))
+        except (OSError, IndexError) as e:
+            raise CommandError(f'Could not read {options["source"]}: {e}')
+
+        with open(options['output'], 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file, lineterminator='\n')
+            writer.writerow(['kind', 'name', 'latitude', 'longitude'])
+            writer.writerows(['city', name, *point] for name, point in sorted(cities.items()))
+            writer.writerows(['postcode', code, *point] for code, point in sorted(postcodes.items()))
+
+        self.stdout.write(f'Wrote {len(cities)} places and {len(postcodes)} postcodes to {options["output"]}')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from delivery.route_cache import RouteCache
+
+
+class Command(BaseCommand):
+    help = 'Delete cached routes older than ROUTE_CACHE_TTL, run it periodically (e.g. daily from cron).'
+
+    def handle(self, *args, **options):
+        deleted = RouteCache(size=0).purge_expired()
+        self.stdout.write(f'Deleted {deleted} expired routes')
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.27 on 2026-10-17 18:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0002_delivery_delivery_created_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedRoute',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('route_key', models.CharField(max_length=64, unique=True)),
+                ('origin', models.TextField()),
+                ('destination', models.TextField()),
+                ('distance_km', models.FloatField()),
+                ('duration_seconds', models.PositiveIntegerField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
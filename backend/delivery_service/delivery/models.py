@@ -22,5 +22,24 @@ class Delivery(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='delivery_created_idx'),
+        ]
+
     def __str__(self):
         return f'Delivery for Oder #{self.order_id} - {self.status}'
+
+
+class CachedRoute(models.Model):
+    """Distance Matrix result of an origin/destination pair, shared by all delivery consumers"""
+    route_key = models.CharField(max_length=64, unique=True)
+    origin = models.TextField()
+    destination = models.TextField()
+    distance_km = models.FloatField()
+    duration_seconds = models.PositiveIntegerField()
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.origin} -> {self.destination}: {self.distance_km} km'
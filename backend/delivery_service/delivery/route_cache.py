@@ -0,0 +1,128 @@
+import hashlib
+import threading
+import time
+
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+
+def normalize_location(location):
+    """Normalized form of an address, so formatting differences hit the same cache entry"""
+    return ' '.join(location.replace(',', ' ').split()).lower()
+
+
+def route_key(origin, destination):
+    pair = f'{normalize_location(origin)}|{normalize_location(destination)}'
+    return hashlib.sha256(pair.encode()).hexdigest()
+
+
+class RouteCache:
+    """
+    Two-tier cache of calculated routes: an in-process LRU in front of the CachedRoute table.
+    Entries older than ttl seconds are ignored in both tiers, purge_expired() deletes the expired rows.
+    """
+
+    def __init__(self, size=None, ttl=None):
+        self.size = settings.ROUTE_CACHE_SIZE if size is None else size
+        self.ttl = settings.ROUTE_CACHE_TTL if ttl is None else ttl
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'db_hits': 0, 'misses': 0}
+
+    def get(self, origin, destination):
+        """Return the cached {'distance_km', 'duration_seconds'} of a route or None."""
+        key = route_key(origin, destination)
+
+        route = self._get_memory(key)
+        if route is not None:
+            self._record('memory_hits')
+            return route
+
+        route, expires_at = self._get_db(key)
+        if route is not None:
+            self._record('db_hits')
+            self._set_memory(key, route, expires_at)
+            return route
+
+        self._record('misses')
+        return None
+
+    def set(self, origin, destination, distance_km, duration_seconds):
+        from .models import CachedRoute
+
+        key = route_key(origin, destination)
+        route = {'distance_km': distance_km, 'duration_seconds': duration_seconds}
+
+        CachedRoute.objects.update_or_create(
+            route_key=key,
+            defaults={'origin': origin, 'destination': destination, **route},
+        )
+        self._set_memory(key, route)
+
+    def purge_expired(self):
+        """Delete the database rows older than ttl seconds, return how many were deleted."""
+        from .models import CachedRoute
+
+        deleted, _ = CachedRoute.objects.filter(updated_at__lt=timezone.now() - timedelta(seconds=self.ttl)).delete()
+        return deleted
+
+    def stats(self):
+        """Return the hit counters and the overall hit rate of this process."""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = sum(stats.values())
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['db_hits']) / lookups, 3) if lookups else 0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._stats.update(memory_hits=0, db_hits=0, misses=0)
+
+    def _get_memory(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            route, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return dict(route)
+
+    def _set_memory(self, key, route, expires_at=None):
+        if self.size <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (dict(route), expires_at or time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def _get_db(self, key):
+        from .models import CachedRoute
+
+        now = timezone.now()
+        route = (
+            CachedRoute.objects.filter(route_key=key, updated_at__gte=now - timedelta(seconds=self.ttl))
+            .values('distance_km', 'duration_seconds', 'updated_at')
+            .first()
+        )
+        if route is None:
+            return None, None
+
+        # Keep the row's remaining lifetime in memory instead of a fresh TTL
+        age = (now - route.pop('updated_at')).total_seconds()
+        return route, time.monotonic() + self.ttl - age
+
+    def _record(self, outcome):
+        with self._lock:
+            self._stats[outcome] += 1
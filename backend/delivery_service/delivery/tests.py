@@ -1,3 +1,684 @@
-from django.test import TestCase
+import asyncio
+import json
+import threading
+from datetime import timedelta
+from io import StringIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import AsyncMock, Mock, patch
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+import aiohttp
+import pika
+import requests
+from django.conf import settings
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from delivery_consumer.async_consumer import AsyncDeliveryConsumer
+from delivery_consumer.consumer import (
+    ATTEMPTS_HEADER, DEAD_QUEUE, MAX_ATTEMPTS, RETRY_QUEUE, DeliveryBatch, DeliveryWorkerPool, process_deliveries,
+    save_delivery,
+)
+from delivery_consumer.order_client import AsyncOrderServiceClient, OrderServiceClient
+
+from .google_maps import GoogleMapsService
+from .models import CachedRoute, Delivery
+from .route_cache import RouteCache, route_key
+from .routing import Gazetteer, RouteEstimator
+
+
+class StubOrderServiceHandler(BaseHTTPRequestHandler):
+    """Serves delivery contexts, answering 503 to the first failures_left requests"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.connections.add(self.client_address)
+            fail = server.failures_left > 0
+            server.failures_left -= fail
+
+        if fail:
+            self.respond(503, {'detail': 'unavailable'})
+            return
+
+        url = urlsplit(self.path)
+        ids = parse_qs(url.query).get('ids')
+        if ids:
+            order_ids = [int(order_id) for order_id in ids[0].split(',')]
+            server.batches.append(order_ids)
+            self.respond(200, [self.context(order_id) for order_id in order_ids if order_id not in server.unbatched])
+            return
+
+        self.respond(200, self.context(int(url.path.strip('/').split('/')[2])))
+
+    def context(self, order_id):
+        return {'order_id': order_id, 'restaurant_address': None, 'customer_address': None}
+
+    def respond(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class OrderServiceClientTestCase(SimpleTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubOrderServiceHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = 0
+        self.server.connections = set()
+        self.server.failures_left = 0
+        self.server.batches = []
+        # Orders the batch endpoint leaves out of its responses
+        self.server.unbatched = set()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.client = OrderServiceClient(f'http://127.0.0.1:{self.server.server_port}', backoff=0, pool_size=4)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connection_reused(self):
+        for order_id in range(5):
+            self.assertEqual(self.client.get_delivery_context(order_id)['order_id'], order_id)
+
+        self.assertEqual(len(self.server.connections), 1)
+        self.assertEqual(self.client.stats()['delivery-context']['calls'], 5)
+
+    def test_retry_on_unavailable(self):
+        self.server.failures_left = 2
+
+        self.assertEqual(self.client.get_delivery_context(1)['order_id'], 1)
+        self.assertEqual(self.server.requests, 3)
+
+    def test_retries_exhausted(self):
+        self.server.failures_left = 10
+        client = OrderServiceClient(f'http://127.0.0.1:{self.server.server_port}', retries=1, backoff=0)
+
+        with self.assertRaises(requests.exceptions.HTTPError):
+            client.get_delivery_context(1)
+
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual(client.stats()['delivery-context']['errors'], 1)
+
+    def test_contexts_fetched_in_batches(self):
+        contexts = self.client.get_delivery_contexts(range(250))
+
+        self.assertEqual(list(contexts), list(range(250)))
+        self.assertTrue(all(context['order_id'] == order_id for order_id, context in contexts.items()))
+        self.assertEqual(sorted(len(batch) for batch in self.server.batches), [50, 100, 100])
+        self.assertEqual(self.server.requests, 3)
+        self.assertLessEqual(len(self.server.connections), 4)
+
+    def test_missing_contexts_fetched_one_by_one(self):
+        self.server.unbatched = {3, 7}
+
+        contexts = self.client.get_delivery_contexts(range(10))
+
+        self.assertEqual(list(contexts), list(range(10)))
+        self.assertEqual(contexts[7]['order_id'], 7)
+        self.assertEqual(self.server.requests, 3)
+        self.assertEqual(self.client.stats()['delivery-context']['calls'], 2)
+
+    def test_async_retry_on_unavailable(self):
+        self.server.failures_left = 2
+
+        async def fetch():
+            client = AsyncOrderServiceClient(f'http://127.0.0.1:{self.server.server_port}', backoff=0)
+            try:
+                return await asyncio.gather(*(client.get_delivery_context(order_id) for order_id in range(3)))
+            finally:
+                await client.close()
+
+        self.assertEqual([context['order_id'] for context in asyncio.run(fetch())], [0, 1, 2])
+        self.assertEqual(self.server.requests, 5)
+
+    def test_async_retries_exhausted(self):
+        self.server.failures_left = 10
+        client = AsyncOrderServiceClient(f'http://127.0.0.1:{self.server.server_port}', retries=1, backoff=0)
+
+        async def fetch():
+            try:
+                return await client.get_delivery_context(1)
+            finally:
+                await client.close()
+
+        with self.assertRaises(aiohttp.ClientResponseError):
+            asyncio.run(fetch())
+
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual(client.stats()['delivery-context']['errors'], 1)
+
+
+class RouteCacheTestCase(TestCase):
+    def setUp(self):
+        self.maps = GoogleMapsService(cache=RouteCache(size=2, ttl=3600))
+        self.api_result = {'distance_km': 4.2, 'duration_seconds': 600, 'status': 'success'}
+
+    def api_results(self, routes):
+        return {route: dict(self.api_result) for route in routes}
+
+    def test_repeat_route_served_from_memory(self):
+        with patch.object(self.maps, '_request_distances', side_effect=self.api_results) as request:
+            self.maps.calculate_distance('Main St 1, Warsaw', 'Long St 2, Warsaw')
+
+            with self.assertNumQueries(0):
+                route = self.maps.calculate_distance('main st 1  warsaw', 'LONG ST 2, WARSAW')
+
+        request.assert_called_once()
+        self.assertEqual(route['distance_km'], 4.2)
+        self.assertEqual(route['status'], 'cached')
+        self.assertEqual(self.maps.cache.stats()['memory_hits'], 1)
+
+    def test_route_shared_through_database(self):
+        with patch.object(self.maps, '_request_distances', side_effect=self.api_results):
+            self.maps.calculate_distance('A', 'B')
+
+        other_process = GoogleMapsService(cache=RouteCache(size=2, ttl=3600))
+        with patch.object(other_process, '_request_distances') as request:
+            route = other_process.calculate_distance('A', 'B')
+
+        request.assert_not_called()
+        self.assertEqual(route['duration_seconds'], 600)
+        self.assertEqual(other_process.cache.stats()['db_hits'], 1)
+
+    def test_expired_route_requested_again(self):
+        CachedRoute.objects.create(route_key=route_key('A', 'B'), origin='A', destination='B',
+                                   distance_km=1, duration_seconds=60)
+        CachedRoute.objects.update(updated_at=timezone.now() - timedelta(hours=2))
+
+        with patch.object(self.maps, '_request_distances', side_effect=self.api_results) as request:
+            route = self.maps.calculate_distance('A', 'B')
+
+        request.assert_called_once()
+        self.assertEqual(route['distance_km'], 4.2)
+        self.assertEqual(CachedRoute.objects.get().distance_km, 4.2)
+
+    def test_purge_route_cache_deletes_expired_rows(self):
+        for origin in ('A', 'B'):
+            CachedRoute.objects.create(route_key=route_key(origin, 'C'), origin=origin, destination='C',
+                                       distance_km=1, duration_seconds=60)
+        CachedRoute.objects.filter(origin='A').update(updated_at=timezone.now() - timedelta(days=8))
+
+        out = StringIO()
+        call_command('purge_route_cache', stdout=out)
+
+        self.assertEqual(list(CachedRoute.objects.values_list('origin', flat=True)), ['B'])
+        self.assertIn('Deleted 1 expired routes', out.getvalue())
+
+    def test_fallback_results_not_cached(self):
+        simulated = {'distance_km': 10, 'duration_seconds': 1200, 'status': 'simulated'}
+        with patch.object(self.maps, '_request_distances', side_effect=lambda routes: {route: simulated for route in routes}):
+            self.maps.calculate_distance('A', 'B')
+
+        self.assertFalse(CachedRoute.objects.exists())
+
+    def test_bypass(self):
+        with patch.object(self.maps, '_request_distances', side_effect=self.api_results) as request:
+            self.maps.calculate_distance('A', 'B')
+            self.maps.calculate_distance('A', 'B', use_cache=False)
+            with self.settings(ROUTE_CACHE_BYPASS=True):
+                self.maps.calculate_distance('A', 'B')
+
+        self.assertEqual(request.call_count, 3)
+
+
+def matrix_response(distances_km):
+    return {
+        'status': 'OK',
+        'rows': [{'elements': [
+            {'status': 'OK', 'distance': {'value': int(km * 1000)}, 'duration': {'value': int(km * 120)}}
+            for km in distances_km
+        ]}],
+    }
+
+
+@override_settings(GOOGLE_MAPS_API_KEY='test-key')
+class DistanceMatrixBatchTestCase(TestCase):
+    def setUp(self):
+        self.maps = GoogleMapsService(cache=RouteCache(size=100, ttl=3600))
+
+    def test_routes_from_one_origin_share_a_request(self):
+        routes = [('Restaurant A', f'Customer {i}') for i in range(30)] + [('Restaurant B', 'Customer 0')]
+
+        def fake_get(url, params, timeout):
+            destinations = params['destinations'].split('|')
+            return Mock(json=Mock(return_value=matrix_response([int(d.split()[-1]) + 1 for d in destinations])))
+
+        with patch.object(self.maps.session, 'get', side_effect=fake_get) as get:
+            results = self.maps.calculate_distances(routes)
+
+        # 25 + 5 destinations for Restaurant A, 1 for Restaurant B
+        self.assertEqual(get.call_count, 3)
+        self.assertEqual([result['distance_km'] for result in results[:30]], [i + 1 for i in range(30)])
+        self.assertEqual(results[30]['distance_km'], 1)
+
+        with patch.object(self.maps.session, 'get') as get:
+            results = self.maps.calculate_distances(routes[:3])
+
+        get.assert_not_called()
+        self.assertTrue(all(result['status'] == 'cached' for result in results))
+
+    def test_failed_element_falls_back_to_simulation(self):
+        response = matrix_response([3])
+        response['rows'][0]['elements'].append({'status': 'NOT_FOUND'})
+
+        with patch.object(self.maps.session, 'get', return_value=Mock(json=Mock(return_value=response))):
+            results = self.maps.calculate_distances([('A', 'X'), ('A', 'Y')])
+
+        self.assertEqual([result['status'] for result in results], ['success', 'simulated'])
+        self.assertEqual(CachedRoute.objects.count(), 1)
+
+
+class ProcessDeliveriesTestCase(TestCase):
+    def setUp(self):
+        self.maps = GoogleMapsService(cache=RouteCache(size=100, ttl=3600))
+        Delivery.objects.create(order_id=1, start_location='A', end_location='B')
+
+    def context(self, order_id):
+        address = {'street': 'Main St', 'house_number': str(order_id), 'city': 'Warsaw'}
+        return {'order_id': order_id, 'restaurant_address': {'street': 'Pizza St', 'city': 'Warsaw'},
+                'customer_address': address}
+
+    def process(self, order_ids, contexts):
+        client = Mock(get_delivery_contexts=Mock(side_effect=contexts))
+
+        with patch('delivery_consumer.consumer.get_order_client', return_value=client), \
+                patch('delivery_consumer.consumer.get_maps_service', return_value=self.maps), \
+                patch.object(self.maps, '_request_distances', side_effect=lambda routes: {
+                    route: {'distance_km': 2.5, 'duration_seconds': 300, 'status': 'success'} for route in routes
+                }) as request:
+            result = process_deliveries(order_ids)
+        return result, client, request
+
+    def test_batch_resolves_routes_together(self):
+        (statuses, failed), client, request = self.process([1, 2, 3, 3], lambda ids: {i: self.context(i) for i in ids})
+
+        client.get_delivery_contexts.assert_called_once_with([2, 3])
+        request.assert_called_once()
+        self.assertEqual(sorted(Delivery.objects.values_list('order_id', flat=True)), [1, 2, 3])
+        # The pending delivery 1 has no status to send yet
+        self.assertEqual([order_id for order_id, message in statuses.items() if message], [2, 3])
+        self.assertEqual(statuses[2]['status'], 'in_progress')
+        self.assertEqual(failed, set())
+
+    def test_precise_coordinates_routed(self):
+        context = self.context(2)
+        context['restaurant_address'].update(latitude=52.2297, longitude=21.0122, geocode_confidence=1.0)
+        context['customer_address'].update(latitude=52.2, longitude=21.0, geocode_confidence=0.2)
+
+        _, _, request = self.process([2], lambda ids: {2: context})
+
+        request.assert_called_once_with([('52.2297,21.0122', 'Main St, 2, Warsaw, Poland')])
+        self.assertEqual(Delivery.objects.get(order_id=2).start_location, 'Pizza St, Warsaw, Poland')
+
+    def test_failed_deliveries_returned(self):
+        contexts = {2: self.context(2), 3: self.context(3), 4: None}
+
+        with patch('delivery_consumer.consumer.save_delivery', side_effect=[RuntimeError('database down'), None]):
+            (statuses, failed), _, _ = self.process([1, 2, 3, 4], lambda ids: contexts)
+
+        self.assertEqual(failed, {2, 4})
+        self.assertEqual(set(statuses), {1, 3})
+
+    def batch(self, channel, *order_ids):
+        batch = DeliveryBatch(channel)
+        for delivery_tag, order_id in enumerate(order_ids, start=1):
+            batch.add(delivery_tag, json.dumps({'order_id': order_id}), attempts=MAX_ATTEMPTS - 1 if order_id == 3 else 0)
+        return batch
+
+    def status(self, order_id):
+        return {'order_id': order_id, 'delivery_id': order_id, 'status': 'in_progress'}
+
+    @patch('delivery_consumer.consumer.process_deliveries')
+    def test_batch_retries_failed_messages(self, process_deliveries):
+        process_deliveries.return_value = ({1: self.status(1)}, {2, 3})
+        channel = Mock()
+        batch = self.batch(channel, 1, 2, 3)
+        batch.add(4, 'not json')
+
+        batch.flush()
+
+        process_deliveries.assert_called_once_with([1, 2, 3])
+        status, retried, dead = [c.kwargs for c in channel.basic_publish.call_args_list]
+        self.assertEqual(json.loads(status['body']), self.status(1))
+        self.assertEqual((retried['routing_key'], json.loads(retried['body'])), (RETRY_QUEUE, {'order_id': 2}))
+        self.assertEqual(retried['properties'].headers, {ATTEMPTS_HEADER: 1})
+        self.assertEqual(retried['properties'].expiration, '30000')
+        self.assertEqual((dead['routing_key'], json.loads(dead['body'])), (DEAD_QUEUE, {'order_id': 3}))
+        self.assertEqual(dead['properties'].headers, {ATTEMPTS_HEADER: MAX_ATTEMPTS})
+        self.assertIsNone(dead['properties'].expiration)
+        self.assertEqual([c.kwargs for c in channel.basic_ack.call_args_list],
+                         [{'delivery_tag': tag} for tag in (1, 2, 3, 4)])
+        channel.basic_nack.assert_not_called()
+        self.assertEqual(batch.count, 0)
+
+    @patch('delivery_consumer.consumer.process_deliveries')
+    def test_batch_error_retries_every_message(self, process_deliveries):
+        process_deliveries.side_effect = RuntimeError('database down')
+        channel = Mock()
+        batch = self.batch(channel, 1, 2)
+
+        with self.assertRaises(RuntimeError):
+            batch.flush()
+
+        self.assertEqual([c.kwargs['routing_key'] for c in channel.basic_publish.call_args_list], [RETRY_QUEUE] * 2)
+        self.assertEqual([c.kwargs for c in channel.basic_ack.call_args_list], [{'delivery_tag': 1}, {'delivery_tag': 2}])
+        self.assertEqual(batch.count, 0)
+
+    @patch('delivery_consumer.consumer.process_deliveries')
+    def test_batch_statuses_published_before_ack(self, process_deliveries):
+        process_deliveries.return_value = ({1: self.status(1), 2: self.status(2), 4: None}, set())
+        channel = Mock()
+        batch = self.batch(channel, 1, 2, 4)
+
+        batch.flush()
+
+        self.assertEqual([call[0] for call in channel.method_calls], ['basic_publish', 'basic_publish', 'basic_ack'])
+        channel.basic_ack.assert_called_once_with(delivery_tag=3, multiple=True)
+        channel.basic_nack.assert_not_called()
+
+    @patch('delivery_consumer.consumer.process_deliveries')
+    def test_batch_publish_error_retries_message(self, process_deliveries):
+        process_deliveries.return_value = ({1: self.status(1), 2: self.status(2)}, set())
+        channel = Mock()
+        channel.basic_publish.side_effect = [None, pika.exceptions.UnroutableError([]), None]
+        batch = self.batch(channel, 1, 2)
+
+        batch.flush()
+
+        self.assertEqual(channel.basic_publish.call_args.kwargs['routing_key'], RETRY_QUEUE)
+        self.assertEqual([c.kwargs for c in channel.basic_ack.call_args_list], [{'delivery_tag': 1}, {'delivery_tag': 2}])
+        channel.basic_nack.assert_not_called()
+
+
+@patch('delivery_consumer.consumer.close_old_connections')
+class DeliveryWorkerPoolTestCase(TestCase):
+    def setUp(self):
+        # Completions run right away instead of on the connection thread
+        connection = Mock(add_callback_threadsafe=Mock(side_effect=lambda callback: callback()))
+        self.channel = Mock()
+        self.pool = DeliveryWorkerPool(connection, self.channel, workers=1)
+        self.addCleanup(self.pool.close)
+
+        self.route = {'distance_km': 2.5, 'duration_seconds': 300, 'status': 'success'}
+        self.maps = Mock(calculate_distance=Mock(return_value=self.route))
+
+    def deliver(self, order_id=7, attempts=0):
+        with patch('delivery_consumer.consumer.fetch_order_details', return_value={
+            'order_id': order_id, 'restaurant_address': 'Pizza St, Warsaw', 'customer_address': 'Main St 1, Warsaw',
+            'restaurant_point': 'Pizza St, Warsaw', 'customer_point': 'Main St 1, Warsaw',
+        }), patch('delivery_consumer.consumer.get_maps_service', return_value=self.maps):
+            # Run on the test thread so the delivery row stays inside the test transaction
+            self.pool._process(delivery_tag=1, body=json.dumps({'order_id': order_id}), attempts=attempts, order_id=order_id)
+
+    def test_acked_after_delivery_saved(self, close_old_connections):
+        self.deliver()
+
+        delivery = Delivery.objects.get(order_id=7)
+        self.assertEqual(delivery.status, Delivery.STATUS_ON_THE_WAY)
+        published = json.loads(self.channel.basic_publish.call_args.kwargs['body'])
+        self.assertEqual(published, {'order_id': 7, 'delivery_id': delivery.id, 'status': 'in_progress', 'distance_km': 2.5})
+        self.channel.basic_ack.assert_called_once_with(delivery_tag=1)
+
+    def test_existing_delivery_acked_without_status(self, close_old_connections):
+        Delivery.objects.create(order_id=7, start_location='A', end_location='B')
+
+        self.deliver()
+
+        self.channel.basic_publish.assert_not_called()
+        self.channel.basic_ack.assert_called_once_with(delivery_tag=1)
+
+    def test_existing_delivery_status_sent_again(self, close_old_connections):
+        delivery = Delivery.objects.create(order_id=7, start_location='A', end_location='B', distance_km=2.5,
+                                           status=Delivery.STATUS_ON_THE_WAY)
+
+        self.deliver(attempts=1)
+
+        published = json.loads(self.channel.basic_publish.call_args.kwargs['body'])
+        self.assertEqual(published, {'order_id': 7, 'delivery_id': delivery.id, 'status': 'in_progress', 'distance_km': 2.5})
+        self.channel.basic_ack.assert_called_once_with(delivery_tag=1)
+        self.maps.calculate_distance.assert_not_called()
+
+    def test_order_service_error_retried(self, close_old_connections):
+        client = Mock(get_delivery_context=Mock(side_effect=requests.exceptions.ConnectionError('refused')))
+
+        with patch('delivery_consumer.consumer.get_order_client', return_value=client):
+            self.pool._process(delivery_tag=1, body=json.dumps({'order_id': 7}), attempts=0, order_id=7)
+
+        self.assertEqual(self.channel.basic_publish.call_args.kwargs['routing_key'], RETRY_QUEUE)
+        self.channel.basic_ack.assert_called_once_with(delivery_tag=1)
+        self.assertFalse(Delivery.objects.exists())
+
+    def test_missing_address_retried(self, close_old_connections):
+        client = Mock(get_delivery_context=Mock(return_value={'order_id': 7, 'restaurant_address': None,
+                                                              'customer_address': {'city': 'Warsaw'}}))
+
+        with patch('delivery_consumer.consumer.get_order_client', return_value=client):
+            self.pool._process(delivery_tag=1, body=json.dumps({'order_id': 7}), attempts=0, order_id=7)
+
+        self.assertEqual(self.channel.basic_publish.call_args.kwargs['routing_key'], RETRY_QUEUE)
+        self.channel.basic_ack.assert_called_once_with(delivery_tag=1)
+
+    def test_failure_retried_after_delay(self, close_old_connections):
+        self.maps.calculate_distance.side_effect = RuntimeError('Maps unavailable')
+
+        self.deliver()
+
+        publish = self.channel.basic_publish.call_args.kwargs
+        self.assertEqual(publish['routing_key'], RETRY_QUEUE)
+        self.assertEqual(json.loads(publish['body']), {'order_id': 7})
+        self.assertEqual(publish['properties'].headers, {ATTEMPTS_HEADER: 1})
+        self.assertEqual(publish['properties'].expiration, '30000')
+        self.channel.basic_ack.assert_called_once_with(delivery_tag=1)
+        self.channel.basic_nack.assert_not_called()
+
+    def test_exhausted_delivery_dead_lettered(self, close_old_connections):
+        self.maps.calculate_distance.side_effect = RuntimeError('Maps unavailable')
+
+        self.deliver(attempts=MAX_ATTEMPTS - 1)
+
+        publish = self.channel.basic_publish.call_args.kwargs
+        self.assertEqual(publish['routing_key'], DEAD_QUEUE)
+        self.assertEqual(publish['properties'].headers, {ATTEMPTS_HEADER: MAX_ATTEMPTS})
+        self.assertIsNone(publish['properties'].expiration)
+        self.channel.basic_ack.assert_called_once_with(delivery_tag=1)
+
+    def test_attempts_read_from_headers(self, close_old_connections):
+        self.pool.executor = Mock()
+        body = json.dumps({'order_id': 7})
+
+        self.pool.callback(self.channel, Mock(delivery_tag=1), Mock(headers={ATTEMPTS_HEADER: 2}), body)
+
+        self.pool.executor.submit.assert_called_once_with(self.pool._process, 1, body, 2, 7)
+
+    def test_concurrent_insert_not_duplicated(self, close_old_connections):
+        # Another worker stored the delivery after this one passed the existence check
+        Delivery.objects.create(order_id=7, start_location='A', end_location='B')
+
+        self.assertIsNone(save_delivery(7, 'Pizza St, Warsaw', 'Main St 1, Warsaw', self.route))
+        self.assertEqual(Delivery.objects.filter(order_id=7).count(), 1)
+
+
+# Deliveries are saved on the offload threads, outside of a test transaction
+class AsyncDeliveryConsumerTestCase(TransactionTestCase):
+    def setUp(self):
+        self.channel = Mock(default_exchange=Mock(publish=AsyncMock()))
+        self.order_client = Mock(get_delivery_context=AsyncMock(side_effect=lambda order_id: {
+            'order_id': order_id,
+            'restaurant_address': {'street': 'Pizza St', 'city': 'Warsaw'},
+            'customer_address': {'street': 'Main St', 'house_number': str(order_id), 'city': 'Warsaw'},
+        }), close=AsyncMock())
+        self.consumer = AsyncDeliveryConsumer(self.channel, self.order_client, workers=2)
+
+        self.maps = Mock(calculate_distance=Mock(return_value={'distance_km': 2.5, 'duration_seconds': 300, 'status': 'success'}))
+        patcher = patch('delivery_consumer.consumer.get_maps_service', return_value=self.maps)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def message(self, order_id, attempts=0):
+        return Mock(body=json.dumps({'order_id': order_id}).encode(), headers={ATTEMPTS_HEADER: attempts} if attempts else {},
+                    ack=AsyncMock(), nack=AsyncMock())
+
+    def published(self):
+        return {call.kwargs['routing_key']: call.args[0] for call in self.channel.default_exchange.publish.await_args_list}
+
+    def consume(self, *messages):
+        async def run():
+            await asyncio.gather(*(self.consumer.on_message(message) for message in messages))
+            await self.consumer.close()
+
+        asyncio.run(run())
+
+    def test_deliveries_overlap(self):
+        messages = [self.message(order_id) for order_id in (1, 2, 3)]
+
+        self.consume(*messages)
+
+        self.assertEqual(sorted(Delivery.objects.values_list('order_id', flat=True)), [1, 2, 3])
+        self.assertEqual(self.channel.default_exchange.publish.await_count, 3)
+        for message in messages:
+            message.ack.assert_awaited_once()
+
+    def test_existing_delivery_acked_without_status(self):
+        Delivery.objects.create(order_id=1, start_location='A', end_location='B')
+        message = self.message(1)
+
+        self.consume(message)
+
+        self.order_client.get_delivery_context.assert_not_awaited()
+        self.channel.default_exchange.publish.assert_not_awaited()
+        message.ack.assert_awaited_once()
+
+    def test_failure_retried_after_delay(self):
+        self.maps.calculate_distance.side_effect = RuntimeError('Maps unavailable')
+        first, exhausted = self.message(1), self.message(2, attempts=MAX_ATTEMPTS - 1)
+
+        self.consume(first, exhausted)
+
+        published = self.published()
+        self.assertEqual(json.loads(published[RETRY_QUEUE].body), {'order_id': 1})
+        self.assertEqual(published[RETRY_QUEUE].headers, {ATTEMPTS_HEADER: 1})
+        self.assertEqual(published[RETRY_QUEUE].expiration, 30)
+        self.assertEqual(json.loads(published[DEAD_QUEUE].body), {'order_id': 2})
+        self.assertEqual(published[DEAD_QUEUE].headers, {ATTEMPTS_HEADER: MAX_ATTEMPTS})
+        self.assertIsNone(published[DEAD_QUEUE].expiration)
+        for message in (first, exhausted):
+            message.ack.assert_awaited_once()
+            message.nack.assert_not_awaited()
+        self.assertFalse(Delivery.objects.exists())
+
+    def test_order_service_error_retried(self):
+        self.order_client.get_delivery_context.side_effect = aiohttp.ClientConnectionError('refused')
+        message = self.message(1)
+
+        self.consume(message)
+
+        self.assertEqual(list(self.published()), [RETRY_QUEUE])
+        message.ack.assert_awaited_once()
+        message.nack.assert_not_awaited()
+        self.assertFalse(Delivery.objects.exists())
+
+    def test_existing_delivery_status_sent_again(self):
+        delivery = Delivery.objects.create(order_id=1, start_location='A', end_location='B', distance_km=2.5,
+                                           status=Delivery.STATUS_ON_THE_WAY)
+        message = self.message(1, attempts=1)
+
+        self.consume(message)
+
+        published = json.loads(self.channel.default_exchange.publish.await_args.args[0].body)
+        self.assertEqual(published, {'order_id': 1, 'delivery_id': delivery.id, 'status': 'in_progress', 'distance_km': 2.5})
+        message.ack.assert_awaited_once()
+
+    def test_invalid_message_acked(self):
+        message = Mock(body=b'not json', ack=AsyncMock())
+
+        self.consume(message)
+
+        message.ack.assert_awaited_once()
+
+
+class RouteEstimatorTestCase(TestCase):
+    def setUp(self):
+        self.estimator = RouteEstimator(Gazetteer.from_csv(settings.GAZETTEER_PATH), road_factor=1.3)
+
+    def test_estimate_between_cities(self):
+        route = self.estimator.estimate('Marszałkowska 1, Warszawa, Poland', 'Floriańska 2, Krakow, Poland')
+
+        # 252 km great-circle distance stretched by the road factor
+        self.assertAlmostEqual(route['distance_km'], 252 * 1.3, delta=5)
+        self.assertEqual(route['duration_seconds'], int(route['distance_km'] * 120))
+        self.assertEqual(route['status'], 'estimated')
+
+    def test_postcode_preferred_and_names_normalized(self):
+        gazetteer = self.estimator.gazetteer
+
+        self.assertEqual(gazetteer.geocode('Piotrkowska 1, 90-001'), gazetteer.geocode('Piotrkowska 1, Łódź'))
+        self.assertEqual(gazetteer.geocode('Piotrkowska 1, LODZ'), gazetteer.geocode('Piotrkowska 1, Łódź'))
+        self.assertEqual(gazetteer.geocode('Monte Cassino 1, Warszawa, 81-701'), gazetteer.geocode('Sopot'))
+
+    def test_unknown_address(self):
+        self.assertIsNone(self.estimator.estimate('Main St 1, Springfield', 'Warszawa'))
+
+    def test_coordinates_used_as_points(self):
+        route = self.estimator.estimate('52.2297,21.0122', 'Floriańska 2, Krakow, Poland')
+
+        self.assertEqual(route, self.estimator.estimate('Warszawa', 'Floriańska 2, Krakow, Poland'))
+
+    def test_same_city_routes_spread(self):
+        routes = [('Rynek 1, Kraków', f'Floriańska {number}, Kraków') for number in range(1, 21)]
+
+        estimates = self.estimator.estimate_many(routes)
+
+        distances = [estimate['distance_km'] for estimate in estimates]
+        self.assertTrue(all(1 <= distance < 8 for distance in distances))
+        self.assertGreater(len(set(distances)), 1)
+        self.assertEqual(estimates, self.estimator.estimate_many(routes))
+
+    def test_used_without_api_key(self):
+        maps = GoogleMapsService(cache=RouteCache(size=10, ttl=3600), estimator=self.estimator)
+
+        route = maps.calculate_distance('Warszawa', 'Kraków')
+        unknown = maps.calculate_distance('Springfield', 'Shelbyville')
+
+        self.assertEqual(route['status'], 'estimated')
+        self.assertEqual(unknown, maps.calculate_distance('Springfield', 'Shelbyville'))
+
+    @override_settings(GOOGLE_MAPS_API_KEY='test-key', ROUTE_ESTIMATE_FIRST=True)
+    def test_estimate_first_refined_in_background(self):
+        maps = GoogleMapsService(cache=RouteCache(size=10, ttl=3600), estimator=self.estimator)
+        # Refine inline, so the refiner writes through the test transaction
+        maps.refiner = Mock(submit=lambda refine, routes: refine(routes))
+
+        with patch.object(maps.session, 'get', return_value=Mock(json=Mock(return_value=matrix_response([300])))), \
+                patch('delivery.google_maps.close_old_connections'):
+            route = maps.calculate_distance('Warszawa', 'Kraków')
+
+        self.assertEqual(route['status'], 'estimated')
+        self.assertEqual(maps.calculate_distance('Warszawa', 'Kraków')['distance_km'], 300)
+
+    @override_settings(GOOGLE_MAPS_API_KEY='test-key', ROUTE_ESTIMATE_FIRST=True)
+    def test_route_refined_once_while_in_flight(self):
+        maps = GoogleMapsService(cache=RouteCache(size=10, ttl=3600), estimator=self.estimator)
+        submitted = []
+        maps.refiner = Mock(submit=lambda refine, routes: submitted.append(routes))
+
+        maps.calculate_distance('Warszawa', 'Kraków')
+        maps.calculate_distance('Warszawa', 'Kraków')
+        self.assertEqual(submitted, [[('Warszawa', 'Kraków')]])
+
+        with patch.object(maps, '_request_distances', return_value={}), \
+                patch('delivery.google_maps.close_old_connections'):
+            maps._refine(submitted[0])
+        maps.calculate_distance('Warszawa', 'Kraków')
+        self.assertEqual(len(submitted), 2)
@@ -4,6 +4,7 @@ from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 
 from .models import Delivery
+from .pagination import CreatedAtCursorPagination
 from .serializers import *
 
 
@@ -20,6 +21,7 @@ class DeliveryListView(generics.ListAPIView):
     queryset = Delivery.objects.all()
     serializer_class = DeliverySerializer
     permission_classes = [AllowAny]
+    pagination_class = CreatedAtCursorPagination
 
 
 class DeliveryDetailView(generics.RetrieveUpdateAPIView):
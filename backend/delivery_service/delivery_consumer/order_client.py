@@ -0,0 +1,212 @@
+import asyncio
+import os
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+ORDER_SERVICE_URL = os.environ.get('ORDER_SERVICE_URL', 'http://order_service:8000')
+ORDER_SERVICE_TIMEOUT = float(os.environ.get('ORDER_SERVICE_TIMEOUT', '10'))
+ORDER_SERVICE_RETRIES = int(os.environ.get('ORDER_SERVICE_RETRIES', '3'))
+ORDER_SERVICE_BACKOFF = float(os.environ.get('ORDER_SERVICE_BACKOFF', '0.2'))
+ORDER_SERVICE_POOL_SIZE = int(os.environ.get('ORDER_SERVICE_POOL_SIZE', '10'))
+
+# Order ids per batch request, the order service's OrderDeliveryContextBatchView accepts up to 100
+CONTEXT_BATCH_SIZE = 100
+
+# Responses worth retrying, the order service or its proxy is restarting or overloaded
+RETRY_STATUSES = (502, 503, 504)
+
+
+class ClientMetrics:
+    """Per-endpoint call timings of an Order Service client"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, elapsed_ms, failed):
+        with self._lock:
+            metric = self._metrics.setdefault(endpoint, {'calls': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            metric['calls'] += 1
+            metric['errors'] += failed
+            metric['total_ms'] += elapsed_ms
+            metric['max_ms'] = max(metric['max_ms'], elapsed_ms)
+
+    def stats(self):
+        """Return {endpoint: {'calls', 'errors', 'avg_ms', 'max_ms'}}"""
+        with self._lock:
+            return {
+                endpoint: {
+                    'calls': metric['calls'],
+                    'errors': metric['errors'],
+                    'avg_ms': round(metric['total_ms'] / metric['calls'], 2) if metric['calls'] else 0,
+                    'max_ms': round(metric['max_ms'], 2),
+                }
+                for endpoint, metric in self._metrics.items()
+            }
+
+
+class OrderServiceClient:
+    """
+    HTTP client for the Order Service internal endpoints.
+    One keep-alive connection pool shared by all threads, retries with exponential
+    backoff on connection errors and 502/503/504, and per-endpoint timing metrics.
+    """
+
+    def __init__(self, base_url=ORDER_SERVICE_URL, timeout=ORDER_SERVICE_TIMEOUT, retries=ORDER_SERVICE_RETRIES,
+                 backoff=ORDER_SERVICE_BACKOFF, pool_size=ORDER_SERVICE_POOL_SIZE):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.pool_size = pool_size
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(['GET']),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.metrics = ClientMetrics()
+
+    def get_delivery_context(self, order_id):
+        """Return the pickup and drop-off addresses of an order, raising requests exceptions on failure"""
+        return self._get('delivery-context', f'/api/orders/{order_id}/delivery-context/')
+
+    def get_delivery_contexts(self, order_ids):
+        """
+        Fetch the delivery contexts of several orders, CONTEXT_BATCH_SIZE orders per request.
+        Orders missing from a batch response are fetched one by one, concurrently over the shared pool.
+        Returns {order_id: context}, orders that could not be fetched map to None.
+        """
+        def fetch_batch(chunk):
+            try:
+                return self._get('delivery-context-batch', f'/api/orders/delivery-context/?ids={",".join(map(str, chunk))}')
+            except requests.exceptions.RequestException as e:
+                print(f"[!] Error fetching delivery contexts of orders {chunk[0]}-{chunk[-1]}: {e}")
+                return []
+
+        def fetch(order_id):
+            try:
+                return self.get_delivery_context(order_id)
+            except requests.exceptions.RequestException as e:
+                print(f"[!] Error fetching delivery context of order {order_id}: {e}")
+                return None
+
+        order_ids = list(dict.fromkeys(order_ids))
+        if not order_ids:
+            return {}
+
+        chunks = [order_ids[i:i + CONTEXT_BATCH_SIZE] for i in range(0, len(order_ids), CONTEXT_BATCH_SIZE)]
+        with ThreadPoolExecutor(max_workers=min(self.pool_size, len(chunks))) as executor:
+            contexts = {context['order_id']: context for batch in executor.map(fetch_batch, chunks) for context in batch}
+
+        missing = [order_id for order_id in order_ids if order_id not in contexts]
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(self.pool_size, len(missing))) as executor:
+                contexts.update(zip(missing, executor.map(fetch, missing)))
+
+        return {order_id: contexts[order_id] for order_id in order_ids}
+
+    def stats(self):
+        """Return {endpoint: {'calls', 'errors', 'avg_ms', 'max_ms'}} for this client"""
+        return self.metrics.stats()
+
+    def close(self):
+        self.session.close()
+
+    def _get(self, endpoint, path):
+        start = time.perf_counter()
+        failed = True
+        try:
+            response = self.session.get(f'{self.base_url}{path}', timeout=self.timeout)
+            response.raise_for_status()
+            failed = False
+            return response.json()
+        finally:
+            self.metrics.record(endpoint, (time.perf_counter() - start) * 1000, failed)
+
+
+class AsyncOrderServiceClient:
+    """
+    asyncio counterpart of OrderServiceClient for the async delivery consumer.
+    Same keep-alive pool limit, retry policy and timing metrics, on an aiohttp session.
+    """
+
+    def __init__(self, base_url=ORDER_SERVICE_URL, timeout=ORDER_SERVICE_TIMEOUT, retries=ORDER_SERVICE_RETRIES,
+                 backoff=ORDER_SERVICE_BACKOFF, pool_size=ORDER_SERVICE_POOL_SIZE):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+
+        # Created on first use, a session belongs to the event loop it was created on
+        self.session = None
+        self.metrics = ClientMetrics()
+
+    async def get_delivery_context(self, order_id):
+        """Return the pickup and drop-off addresses of an order, raising aiohttp or timeout errors on failure"""
+        return await self._get('delivery-context', f'/api/orders/{order_id}/delivery-context/')
+
+    def stats(self):
+        """Return {endpoint: {'calls', 'errors', 'avg_ms', 'max_ms'}} for this client"""
+        return self.metrics.stats()
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+    async def _get(self, endpoint, path):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+            )
+
+        start = time.perf_counter()
+        failed = True
+        try:
+            for attempt in range(self.retries + 1):
+                last_attempt = attempt == self.retries
+                try:
+                    async with self.session.get(f'{self.base_url}{path}') as response:
+                        if response.status not in RETRY_STATUSES or last_attempt:
+                            response.raise_for_status()
+                            context = await response.json()
+                            failed = False
+                            return context
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                    if last_attempt:
+                        raise
+
+                # Same backoff as urllib3's Retry: none before the first retry, doubling after
+                if attempt:
+                    await asyncio.sleep(self.backoff * 2 ** attempt)
+        finally:
+            self.metrics.record(endpoint, (time.perf_counter() - start) * 1000, failed)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_order_client():
+    """Return the process wide Order Service client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = OrderServiceClient()
+    return _client
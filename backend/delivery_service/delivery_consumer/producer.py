@@ -3,6 +3,33 @@ import json
 import os
 
 
+def build_status_message(order_id, delivery_id, status, distance_km=None):
+    message = {
+        "order_id": order_id,
+        "delivery_id": delivery_id,
+        "status": status,
+    }
+
+    if distance_km is not None:
+        message["distance_km"] = distance_km
+
+    return message
+
+
+def publish_delivery_status(channel, message):
+    """ Publish a delivery status message on an open channel, delivery_status must be declared """
+    channel.basic_publish(
+        exchange='',
+        routing_key="delivery_status",
+        body=json.dumps(message),
+        properties=pika.BasicProperties(
+            delivery_mode=2,  # Make message persistent
+        )
+    )
+
+    print(f"[+] Sent delivery status to RabbitMQ: {message}")
+
+
 def send_delivery_status(order_id, delivery_id, status, distance_km=None):
     """ Send delivery status update to order service """
     try:
@@ -15,27 +42,7 @@ def send_delivery_status(order_id, delivery_id, status, distance_km=None):
         # Declare queue
         channel.queue_declare(queue="delivery_status", durable=True)
         
-        # Prepare message
-        message = {
-            "order_id": order_id,
-            "delivery_id": delivery_id,
-            "status": status,
-        }
-        
-        if distance_km is not None:
-            message["distance_km"] = distance_km
-        
-        # Publish message
-        channel.basic_publish(
-            exchange='',
-            routing_key="delivery_status",
-            body=json.dumps(message),
-            properties=pika.BasicProperties(
-                delivery_mode=2,  # Make message persistent
-            )
-        )
-        
-        print(f"[+] Sent delivery status to RabbitMQ: {message}")
+        publish_delivery_status(channel, build_status_message(order_id, delivery_id, status, distance_km))
         
         connection.close()
         
@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 import os
 from pathlib import Path
 
+import gazetteer
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -85,6 +87,9 @@ DATABASES = {
         'PASSWORD': os.environ.get('POSTGRES_PASSWORD'),
         'HOST': os.environ.get('DB_HOST'),
         'PORT': os.environ.get('DB_PORT'),
+        # Seconds a connection is reused, long-running consumers keep their worker connections open
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '0')),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
@@ -143,6 +148,19 @@ REST_FRAMEWORK = {
 # Google Maps API
 GOOGLE_MAPS_API_KEY = os.environ.get('GOOGLE_MAPS_API_KEY', '')
 
+# Route cache in front of the Distance Matrix API: in-process LRU entries, TTL in seconds, kill switch
+ROUTE_CACHE_SIZE = int(os.environ.get('ROUTE_CACHE_SIZE', '1024'))
+ROUTE_CACHE_TTL = int(os.environ.get('ROUTE_CACHE_TTL', str(7 * 24 * 3600)))
+ROUTE_CACHE_BYPASS = os.environ.get('ROUTE_CACHE_BYPASS', 'False') == 'True'
+
+# Offline route estimates: gazetteer of city and postcode coordinates, road distance / great-circle distance,
+# and whether estimates answer first while the Distance Matrix API refines the route in the background
+GAZETTEER_PATH = os.environ.get('GAZETTEER_PATH', str(gazetteer.BUNDLED_PATH))
+ROUTE_ROAD_FACTOR = float(os.environ.get('ROUTE_ROAD_FACTOR', '1.3'))
+ROUTE_ESTIMATE_FIRST = os.environ.get('ROUTE_ESTIMATE_FIRST', 'False') == 'True'
+# Addresses Order Service geocoded with at least this confidence are routed by their coordinates
+ROUTE_MIN_GEOCODE_CONFIDENCE = float(os.environ.get('ROUTE_MIN_GEOCODE_CONFIDENCE', '0.8'))
+
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
@@ -0,0 +1,58 @@
+import os
+import time
+
+import django
+import pika
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'order_service.settings')
+
+django.setup()
+
+from orders.outbox import MAX_ATTEMPTS, relay_batch
+from order_consumer.producer import Publisher
+
+BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", "100"))
+POLL_INTERVAL = float(os.environ.get("OUTBOX_POLL_INTERVAL", "0.5"))
+MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", MAX_ATTEMPTS))
+# Longest wait between reconnects while the broker is unreachable, the wait doubles from 1 second
+MAX_BACKOFF = float(os.environ.get("OUTBOX_MAX_BACKOFF", "30"))
+
+
+def start_relay():
+    """Drain the outbox in batches, sleeping only while it is empty"""
+    publisher = Publisher(confirms=True)
+
+    print(f"[*] Relaying outbox messages in batches of {BATCH_SIZE}...")
+
+    backoff = 1
+    try:
+        while True:
+            try:
+                published = relay_batch(publisher, BATCH_SIZE, MAX_ATTEMPTS)
+            except pika.exceptions.AMQPError as e:
+                # Pending messages keep their attempts, they are published once the broker is back
+                print(f"[!] Broker unreachable: {e!r}, retrying in {backoff:g} seconds")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+                continue
+
+            backoff = 1
+            if published:
+                print(f"[+] Published {published} outbox messages")
+            if published < BATCH_SIZE:
+                publisher.process_events()
+                time.sleep(POLL_INTERVAL)
+    finally:
+        publisher.close()
+
+
+if __name__ == "__main__":
+    print("[*] Starting Order Outbox Relay...")
+
+    while True:
+        try:
+            start_relay()
+        except Exception as e:
+            print(f"[!] Relay error: {e}")
+            print("[*] Retrying in 5 seconds...")
+            time.sleep(5)
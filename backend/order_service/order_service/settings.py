@@ -14,6 +14,8 @@ import os
 
 from pathlib import Path
 
+import gazetteer
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -117,6 +119,30 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# The menu cache defaults to per-process local memory. In production point it at a
+# shared backend, e.g. MENU_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# and MENU_CACHE_LOCATION=redis://redis:6379/1
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'menu': {
+        'BACKEND': os.environ.get('MENU_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('MENU_CACHE_LOCATION', 'menu'),
+        'TIMEOUT': int(os.environ.get('MENU_CACHE_TIMEOUT', 300)),
+    },
+}
+
+# Geocoding of saved addresses: Google Geocoding API when a key is set, otherwise the gazetteer CSV
+# shared with the delivery service (backend/common). Runs in a background thread unless disabled.
+GOOGLE_MAPS_API_KEY = os.environ.get('GOOGLE_MAPS_API_KEY', '')
+GEOCODER_GAZETTEER_PATH = os.environ.get('GEOCODER_GAZETTEER_PATH', str(gazetteer.BUNDLED_PATH))
+GEOCODING_ASYNC = os.environ.get('GEOCODING_ASYNC', 'True') == 'True'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
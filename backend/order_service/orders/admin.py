@@ -12,3 +12,4 @@ admin.site.register(RestaurantAddress)
 admin.site.register(Product)
 admin.site.register(Order)
 admin.site.register(OrderItem)
+admin.site.register(OutboxMessage)
@@ -0,0 +1,107 @@
+import hashlib
+import threading
+import time
+
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from rest_framework.renderers import JSONRenderer
+
+MENU_CACHE_ALIAS = 'menu'
+
+_stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def _menu_cache():
+    return caches[MENU_CACHE_ALIAS]
+
+
+def _new_version():
+    # Seeded from the clock so a version evicted from the cache is never reused
+    return time.time_ns() // 1000
+
+
+def _get_version(key):
+    cache = _menu_cache()
+
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _bump_version(key):
+    cache = _menu_cache()
+
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), timeout=None)
+
+
+def get_menu_version(restaurant_slug):
+    """Return the current menu version of a restaurant."""
+    return _get_version(f'menu:version:{restaurant_slug}')
+
+
+def bump_menu_version(restaurant_slug):
+    """
+    Invalidate every cached page of a restaurant's menu.
+    Call this after bulk writes (bulk_create, queryset update) which do not send signals.
+    """
+    _bump_version(f'menu:version:{restaurant_slug}')
+
+
+def get_restaurants_version():
+    """Return the version of the restaurant listing (restaurants and their addresses)."""
+    return _get_version('restaurants:version')
+
+
+def bump_restaurants_version():
+    _bump_version('restaurants:version')
+
+
+def menu_cache_stats():
+    """Return the menu cache hit and miss counters of this process."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_menu_cache_stats():
+    with _stats_lock:
+        _stats.update(hits=0, misses=0)
+
+
+def _record(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def _menu_key(request, restaurant_slug):
+    variant = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return f'menu:{restaurant_slug}:{get_menu_version(restaurant_slug)}:{variant}'
+
+
+def cached_menu_response(request, restaurant_slug, render):
+    """
+    Serve pre-rendered menu JSON from the cache, calling render() on a miss.
+    render must return a DRF Response; only 200 responses are cached.
+    """
+    cache = _menu_cache()
+    key = _menu_key(request, restaurant_slug)
+
+    body = cache.get(key)
+    if body is not None:
+        _record('hits')
+        return HttpResponse(body, content_type='application/json')
+
+    _record('misses')
+    response = render()
+    if response.status_code != 200:
+        return response
+
+    body = JSONRenderer().render(response.data)
+    cache.set(key, body)
+    return HttpResponse(body, content_type='application/json')
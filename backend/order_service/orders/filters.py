@@ -1,12 +1,45 @@
+import re
+
 import django_filters
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db.models import F
+
+from .models import Restaurant, RestaurantAddress, normalize_city
+
+# Must match the expression of the restaurant_name_search_idx index
+NAME_SEARCH_VECTOR = SearchVector('name', config='simple')
+
 
-from .models import Restaurant
+def prefix_search_query(value):
+    """Build a tsquery matching every word of value as a prefix, e.g. 'piz hu' -> 'piz:* & hu:*'."""
+    words = re.findall(r'\w+', value.lower())
+    if not words:
+        return None
+    return SearchQuery(' & '.join(f'{word}:*' for word in words), config='simple', search_type='raw')
 
 
 class RestaurantFilter(django_filters.FilterSet):
     name = django_filters.CharFilter(field_name='name', lookup_expr='icontains')
-    city = django_filters.CharFilter(field_name='restaurantaddress__address__city', lookup_expr='iexact')
+    city = django_filters.CharFilter(method='filter_city')
+    search = django_filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Restaurant
-        fields = ['name', 'city']
+        fields = ['name', 'city', 'search']
+
+    def filter_city(self, queryset, name, value):
+        in_city = RestaurantAddress.objects.filter(city_key=normalize_city(value)).values('restaurant_id')
+        return queryset.filter(id__in=in_city)
+
+    def filter_search(self, queryset, name, value):
+        query = prefix_search_query(value)
+        if query is None:
+            return queryset
+
+        return (
+            queryset
+            .annotate(search_vector=NAME_SEARCH_VECTOR)
+            .filter(search_vector=query)
+            .annotate(rank=SearchRank(F('search_vector'), query))
+            .order_by('-rank', 'id')
+        )
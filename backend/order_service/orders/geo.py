@@ -0,0 +1,32 @@
+import math
+
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """Return (min_lat, max_lat, min_lng, max_lng) of the box enclosing a circle around a point."""
+    delta_lat = radius_km / KM_PER_DEGREE
+    # Longitude degrees shrink towards the poles, clamp to keep the box finite there
+    delta_lng = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+    return (
+        max(latitude - delta_lat, -90),
+        min(latitude + delta_lat, 90),
+        max(longitude - delta_lng, -180),
+        min(longitude + delta_lng, 180),
+    )
+
+
+def distance_km(latitude, longitude, lat_field='latitude', lng_field='longitude'):
+    """Database expression of the haversine distance from a point to the coordinates in lat_field and lng_field."""
+    lat1, lng1 = Value(math.radians(latitude)), Value(math.radians(longitude))
+    lat2, lng2 = Radians(F(lat_field)), Radians(F(lng_field))
+
+    a = (
+        Power(Sin((lat2 - lat1) / 2), 2)
+        + Cos(lat1) * Cos(lat2) * Power(Sin((lng2 - lng1) / 2), 2)
+    )
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Sqrt(a), output_field=FloatField())
@@ -0,0 +1,142 @@
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import requests
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from gazetteer import Gazetteer
+
+GEOCODE_URL = 'https://maps.googleapis.com/maps/api/geocode/json'
+
+# Confidence of a Google result by its location_type
+LOCATION_TYPE_CONFIDENCE = {
+    'ROOFTOP': 1.0,
+    'RANGE_INTERPOLATED': 0.8,
+    'GEOMETRIC_CENTER': 0.6,
+    'APPROXIMATE': 0.4,
+}
+
+# Gazetteer matches only locate the postcode area or the city centre
+POSTCODE_CONFIDENCE = 0.3
+CITY_CONFIDENCE = 0.2
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='geocoding')
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+
+def _load_gazetteer():
+    global _gazetteer
+    if _gazetteer is None:
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                path = settings.GEOCODER_GAZETTEER_PATH
+                _gazetteer = Gazetteer.from_csv(path) if path else Gazetteer()
+    return _gazetteer
+
+
+def _geocode_google(query):
+    response = requests.get(GEOCODE_URL, params={'address': query, 'key': settings.GOOGLE_MAPS_API_KEY}, timeout=10)
+    response.raise_for_status()
+    data = response.json()
+    if data['status'] != 'OK':
+        return None
+
+    result = data['results'][0]['geometry']
+    location = result['location']
+    return location['lat'], location['lng'], LOCATION_TYPE_CONFIDENCE.get(result.get('location_type'), 0.4)
+
+
+def _geocode_gazetteer(address):
+    located = _load_gazetteer().locate(', '.join(filter(None, [address.zip_code, address.city])))
+    if located is None:
+        return None
+
+    point, kind = located
+    return (*point, POSTCODE_CONFIDENCE if kind == 'postcode' else CITY_CONFIDENCE)
+
+
+def geocode(address):
+    """Return (latitude, longitude, confidence) of an Address, or None when it could not be located."""
+    if settings.GOOGLE_MAPS_API_KEY:
+        query = ', '.join(filter(None, [address.street, address.house_number, address.zip_code, address.city, address.country]))
+        try:
+            result = _geocode_google(query)
+            if result:
+                return result
+        except (requests.exceptions.RequestException, KeyError, IndexError, ValueError) as e:
+            print(f"[!] Geocoding of address {address.pk} failed: {e}")
+
+    return _geocode_gazetteer(address)
+
+
+def _update_restaurant_addresses(address_id, latitude, longitude):
+    """
+    Update the coordinates copied to the restaurant addresses. update() skips the signals,
+    so the restaurants are touched here for the listing and detail conditional GETs.
+    """
+    from .cache import bump_restaurants_version
+    from .models import Restaurant, RestaurantAddress
+
+    restaurant_addresses = RestaurantAddress.objects.filter(address_id=address_id)
+    restaurant_ids = list(restaurant_addresses.values_list('restaurant_id', flat=True))
+    if not restaurant_ids:
+        return
+
+    restaurant_addresses.update(latitude=latitude, longitude=longitude)
+    Restaurant.objects.filter(pk__in=restaurant_ids).update(updated_at=timezone.now())
+    bump_restaurants_version()
+
+
+def geocode_address(address_id):
+    """
+    Geocode a saved address and store its coordinates with a single UPDATE.
+    The UPDATE only matches the address as it was read: an edit saved meanwhile
+    schedules its own geocoding, and this older result is dropped.
+    """
+    from .models import Address
+
+    address = Address.objects.filter(pk=address_id).first()
+    if address is None:
+        return False
+
+    unchanged = Address.objects.filter(pk=address_id, updated_at=address.updated_at)
+    result = geocode(address)
+    if result is None:
+        if unchanged.update(latitude=None, longitude=None, geocode_confidence=0):
+            _update_restaurant_addresses(address_id, None, None)
+        return False
+
+    latitude, longitude, confidence = result
+    latitude, longitude = round(Decimal(str(latitude)), 6), round(Decimal(str(longitude)), 6)
+    if not unchanged.update(latitude=latitude, longitude=longitude, geocode_confidence=confidence):
+        return False
+    # Copy searched by the nearby restaurants endpoint
+    _update_restaurant_addresses(address_id, float(latitude), float(longitude))
+    return True
+
+
+def _geocode_in_background(address_id):
+    try:
+        geocode_address(address_id)
+    except Exception as e:
+        print(f"[!] Geocoding of address {address_id} failed: {e}")
+    finally:
+        close_old_connections()
+
+
+def schedule_geocoding(address):
+    """
+    Geocode an address once the current transaction commits, in a background thread
+    so requests never wait on the geocoder.
+    """
+    address_id = address.pk
+    if settings.GEOCODING_ASYNC:
+        transaction.on_commit(lambda: _executor.submit(_geocode_in_background, address_id))
+    else:
+        transaction.on_commit(lambda: geocode_address(address_id))
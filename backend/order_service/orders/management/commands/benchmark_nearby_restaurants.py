@@ -0,0 +1,96 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from orders.geo import distance_km
+from orders.models import Address, Restaurant, RestaurantAddress
+
+# Rough bounding box of Poland
+LATITUDE_RANGE = (49.0, 54.8)
+LONGITUDE_RANGE = (14.1, 24.1)
+
+SEARCH_POINTS = [
+    ('Warszawa', 52.2297, 21.0122),
+    ('Poznan', 52.4064, 16.9252),
+    ('Gdansk', 54.3520, 18.6466),
+    ('Bieszczady', 49.2000, 22.5000),
+]
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare the indexed nearby restaurants query with a full scan on a seeded dataset (rolled back afterwards).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurants', type=int, default=100_000)
+        parser.add_argument('--radius', type=float, default=5)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--explain', action='store_true', help='Print the query plan of every measured query')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.seed(options['restaurants'])
+                self.run(options['radius'], options['repeat'], options['explain'])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def seed(self, count):
+        rng = random.Random(42)
+        self.stdout.write(f'Seeding {count} restaurants...')
+
+        restaurants = Restaurant.objects.bulk_create(
+            Restaurant(name=f'Benchmark {i}', slug=f'benchmark-{i}') for i in range(count)
+        )
+        addresses = Address.objects.bulk_create(
+            Address(
+                city='Benchmark', zip_code='00-001', street='Benchmark', house_number=str(i),
+                latitude=round(rng.uniform(*LATITUDE_RANGE), 6), longitude=round(rng.uniform(*LONGITUDE_RANGE), 6),
+            )
+            for i in range(count)
+        )
+        RestaurantAddress.objects.bulk_create(
+            RestaurantAddress(
+                restaurant=restaurant, address=address, city_key='benchmark',
+                latitude=address.latitude, longitude=address.longitude,
+            )
+            for restaurant, address in zip(restaurants, addresses)
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def run(self, radius, repeat, explain):
+        for name, latitude, longitude in SEARCH_POINTS:
+            cases = [
+                ('indexed', RestaurantAddress.objects.nearby(latitude, longitude, radius)),
+                ('full scan', (
+                    RestaurantAddress.objects
+                    .annotate(distance_km=distance_km(latitude, longitude))
+                    .filter(distance_km__lte=radius)
+                    .order_by('distance_km', 'id')
+                )),
+            ]
+
+            for label, queryset in cases:
+                queryset = queryset.select_related('restaurant', 'address')[:50]
+                if explain:
+                    self.stdout.write(queryset.explain())
+
+                timings = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    rows = len(list(queryset.all()))
+                    timings.append((time.perf_counter() - start) * 1000)
+
+                self.stdout.write(
+                    f'{name:<12} {label:<10} {rows:>4} rows   median {statistics.median(timings):8.2f} ms'
+                    f'   p95 {sorted(timings)[int(repeat * 0.95) - 1]:8.2f} ms'
+                )
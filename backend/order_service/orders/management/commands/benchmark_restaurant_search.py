@@ -0,0 +1,83 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from orders.filters import RestaurantFilter
+from orders.models import Address, Restaurant, RestaurantAddress, normalize_city
+
+NAME_WORDS = ['Pizza', 'Sushi', 'Burger', 'Kebab', 'Pierogi', 'Ramen', 'Taco', 'Curry', 'Grill', 'Bistro']
+NAME_SUFFIXES = ['Hut', 'House', 'Bar', 'Corner', 'Express', 'Palace', 'Garden', 'King', 'Station', 'Kitchen']
+CITIES = ['Warszawa', 'Krakow', 'Poznan', 'Gdansk', 'Wroclaw', 'Lodz', 'Szczecin', 'Lublin']
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare icontains and full-text restaurant name search latency on a seeded dataset (rolled back afterwards).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurants', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--explain', action='store_true', help='Print the query plan of every measured query')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.seed(options['restaurants'])
+                self.run(options['repeat'], options['explain'])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def seed(self, count):
+        rng = random.Random(42)
+        self.stdout.write(f'Seeding {count} restaurants...')
+
+        restaurants = Restaurant.objects.bulk_create(
+            Restaurant(
+                name=f'{rng.choice(NAME_WORDS)} {rng.choice(NAME_SUFFIXES)} {i}',
+                slug=f'benchmark-{i}',
+            )
+            for i in range(count)
+        )
+        addresses = Address.objects.bulk_create(
+            Address(city=rng.choice(CITIES), zip_code='00-001', street='Benchmark', house_number=str(i))
+            for i in range(count)
+        )
+        RestaurantAddress.objects.bulk_create(
+            RestaurantAddress(restaurant=restaurant, address=address, city_key=normalize_city(address.city))
+            for restaurant, address in zip(restaurants, addresses)
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def run(self, repeat, explain):
+        cases = [
+            ('name icontains "sushi palace 4242"', {'name': 'sushi palace 4242'}),
+            ('search "sushi palace 4242"', {'search': 'sushi palace 4242'}),
+            ('name icontains "ramen"', {'name': 'ramen'}),
+            ('search "ramen"', {'search': 'ramen'}),
+            ('search "ram kit 99"', {'search': 'ram kit 99'}),
+            ('city "gdansk"', {'city': 'gdansk'}),
+        ]
+
+        for label, params in cases:
+            queryset = RestaurantFilter(params, queryset=Restaurant.objects.all()).qs[:50]
+            if explain:
+                self.stdout.write(queryset.explain())
+
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - start) * 1000)
+
+            self.stdout.write(
+                f'{label:<36} median {statistics.median(timings):8.2f} ms   p95 {sorted(timings)[int(repeat * 0.95) - 1]:8.2f} ms'
+            )
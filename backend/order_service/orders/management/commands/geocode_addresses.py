@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from orders.geocoding import geocode_address
+from orders.models import Address
+
+
+class Command(BaseCommand):
+    help = 'Geocode the addresses that were never geocoded (geocode_confidence is NULL), e.g. saved before geocoding existed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, help='Geocode at most this many addresses')
+
+    def handle(self, *args, **options):
+        address_ids = Address.objects.filter(geocode_confidence__isnull=True).order_by('pk').values_list('pk', flat=True)
+        if options['limit']:
+            address_ids = address_ids[:options['limit']]
+        address_ids = list(address_ids)
+
+        located = 0
+        for done, address_id in enumerate(address_ids, start=1):
+            located += geocode_address(address_id)
+            if done % 100 == 0:
+                self.stdout.write(f'{done}/{len(address_ids)} addresses geocoded...')
+
+        self.stdout.write(self.style.SUCCESS(f'Located {located} of {len(address_ids)} addresses'))
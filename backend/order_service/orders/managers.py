@@ -1,4 +1,10 @@
 from django.contrib.auth.base_user import BaseUserManager
+from django.db import models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import JSONObject
+
+from .geo import bounding_box, distance_km
+from .totals import schedule_total_refresh
 
 
 class CustomUserManager(BaseUserManager):
@@ -29,4 +35,83 @@ class CustomUserManager(BaseUserManager):
         if extra_fields.get('is_superuser') is not True:
             raise ValueError('Superuser must have is_superuser=True.')
 
-        return self.create_user(email, password, **extra_fields)
\ No newline at end of file
+        return self.create_user(email, password, **extra_fields)
+
+class OrderItemQuerySet(models.QuerySet):
+    """QuerySet that keeps the parent orders' total_price in sync for bulk writes"""
+    TOTAL_FIELDS = {'order', 'order_id', 'quantity', 'price'}
+
+    def bulk_create(self, objs, *args, refresh_totals=True, **kwargs):
+        """Pass refresh_totals=False when the orders were created with their final total_price"""
+        objs = super().bulk_create(objs, *args, **kwargs)
+        if refresh_totals:
+            schedule_total_refresh({obj.order_id for obj in objs}, using=self.db)
+        return objs
+
+    def update(self, **kwargs):
+        if not self.TOTAL_FIELDS & kwargs.keys():
+            return super().update(**kwargs)
+
+        order_ids = set(self.values_list('order_id', flat=True))
+        rows = super().update(**kwargs)
+
+        new_order = kwargs.get('order_id', kwargs.get('order'))
+        if new_order is not None:
+            order_ids.add(getattr(new_order, 'pk', new_order))
+
+        schedule_total_refresh(order_ids, using=self.db)
+        return rows
+
+
+class RestaurantAddressQuerySet(models.QuerySet):
+    def nearby(self, latitude, longitude, radius_km):
+        """
+        Restaurant addresses within radius_km of a point, nearest first, annotated with distance_km.
+        The bounding box is answered by restaurantaddress_geo_idx, the exact distance is only
+        computed for the rows inside it.
+        """
+        min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+
+        return (
+            self.filter(latitude__range=(min_lat, max_lat), longitude__range=(min_lng, max_lng))
+            .annotate(distance_km=distance_km(latitude, longitude))
+            .filter(distance_km__lte=radius_km)
+            .order_by('distance_km', 'id')
+        )
+
+
+class RestaurantQuerySet(models.QuerySet):
+    def with_addresses(self, city=None):
+        """Prefetch restaurant addresses (optionally only those in city) into prefetched_addresses"""
+        from .models import RestaurantAddress, normalize_city
+
+        addresses = RestaurantAddress.objects.select_related('address').order_by('id')
+        if city:
+            addresses = addresses.filter(city_key=normalize_city(city))
+
+        return self.prefetch_related(
+            models.Prefetch('restaurantaddress_set', queryset=addresses, to_attr='prefetched_addresses')
+        )
+
+
+class OrderQuerySet(models.QuerySet):
+    ADDRESS_FIELDS = [
+        'id', 'country', 'city', 'zip_code', 'street', 'house_number', 'apartment_number',
+        'latitude', 'longitude', 'geocode_confidence',
+    ]
+
+    def with_delivery_context(self):
+        """Annotate the first restaurant and customer address of each order as JSON objects, in the same query"""
+        from .models import RestaurantAddress, UserAddress
+
+        def first_address(model, owner_field):
+            address = JSONObject(**{field: f'address__{field}' for field in self.ADDRESS_FIELDS})
+            return Subquery(
+                model.objects.filter(**{owner_field: OuterRef(owner_field)}).order_by('id').values_list(address)[:1],
+                output_field=models.JSONField(),
+            )
+
+        return self.annotate(
+            restaurant_address=first_address(RestaurantAddress, 'restaurant_id'),
+            customer_address=first_address(UserAddress, 'user_id'),
+        )
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.27 on 2026-10-17 18:06
+
+from django.db import migrations, models
+
+
+def populate_city_key(apps, schema_editor):
+    RestaurantAddress = apps.get_model('orders', 'RestaurantAddress')
+
+    batch = []
+    for restaurant_address in RestaurantAddress.objects.select_related('address').iterator(chunk_size=1000):
+        restaurant_address.city_key = ' '.join(restaurant_address.address.city.split()).lower()
+        batch.append(restaurant_address)
+        if len(batch) == 1000:
+            RestaurantAddress.objects.bulk_update(batch, ['city_key'])
+            batch = []
+    RestaurantAddress.objects.bulk_update(batch, ['city_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0017_address_address_city_upper_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurantaddress',
+            name='city_key',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(populate_city_key, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='restaurantaddress',
+            index=models.Index(fields=['city_key', 'restaurant'], name='restaurantaddress_city_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.27 on 2026-10-17 18:33
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def populate_coordinates(apps, schema_editor):
+    """
+    Copy the coordinates geocoded so far. Addresses saved before 0020_address_geocode have none,
+    `python manage.py geocode_addresses` geocodes them after migrating and fills these copies too.
+    """
+    Address = apps.get_model('orders', 'Address')
+    RestaurantAddress = apps.get_model('orders', 'RestaurantAddress')
+
+    addresses = Address.objects.filter(pk=OuterRef('address_id'))
+    RestaurantAddress.objects.update(
+        latitude=Subquery(addresses.values('latitude')[:1]),
+        longitude=Subquery(addresses.values('longitude')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0020_address_geocode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurantaddress',
+            name='latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='restaurantaddress',
+            name='longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(populate_coordinates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='restaurantaddress',
+            index=models.Index(fields=['latitude', 'longitude'], name='restaurantaddress_geo_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.27 on 2026-10-17 19:03
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0021_restaurantaddress_coordinates'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='address',
+            name='address_city_upper_idx',
+        ),
+    ]
@@ -1,13 +1,21 @@
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
 from django.db import models
 from django.utils.text import slugify
 from django.core.exceptions import ValidationError
 
-from .managers import CustomUserManager
+from .managers import CustomUserManager, OrderItemQuerySet, OrderQuerySet, RestaurantAddressQuerySet, RestaurantQuerySet
+from .slugs import save_with_unique_slug
 
 # Create your models here.
 
 
+def normalize_city(city):
+    """Normalized city key used for case-insensitive city lookups"""
+    return ' '.join(city.split()).lower()
+
+
 class Address(models.Model):
     country = models.CharField(max_length=50, default="Poland")
     city = models.CharField(max_length=100)
@@ -16,6 +24,11 @@ class Address(models.Model):
     house_number = models.CharField(max_length=50)
     apartment_number = models.CharField(max_length=50, blank=True, null=True)
 
+    # Filled in the background after the address is saved, see orders.geocoding
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, blank=True, null=True, editable=False)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, blank=True, null=True, editable=False)
+    geocode_confidence = models.FloatField(blank=True, null=True, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -23,6 +36,13 @@ class Address(models.Model):
         apt = f"/{self.apartment_number}" if self.apartment_number else ""
         return f"{self.street}, {self.house_number}/{apt}, {self.city}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets the post_save signal skip the city_key sync when the city did not change
+        instance._loaded_city = instance.__dict__.get('city')
+        return instance
+
 
 class User(AbstractBaseUser, PermissionsMixin):
     username = None
@@ -44,6 +64,11 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     objects = CustomUserManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='user_created_idx'),
+        ]
+
     def __str__(self):
         return self.email
 
@@ -60,38 +85,53 @@ class Restaurant(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = RestaurantQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='restaurant_created_idx'),
+            GinIndex(SearchVector('name', config='simple'), name='restaurant_name_search_idx'),
+        ]
+
     def save(self, *args, **kwargs):
-        if not self.slug:
-            base_slug = slugify(self.name)
-            slug = base_slug
-            counter = 1
-            while Restaurant.objects.filter(slug=slug).exists():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-            self.slug = slug
-        super().save(*args, **kwargs)
+        if self.slug:
+            return super().save(*args, **kwargs)
+        save_with_unique_slug(self, slugify(self.name), super().save, *args, **kwargs)
 
     def update_slug_with_address(self, address):
         base_slug = slugify(f"{self.name}-{address.street}")
-        slug = base_slug
-        counter = 1
-        while Restaurant.objects.filter(slug=slug).exclude(pk=self.pk).exists():
-            slug = f"{base_slug}-{counter}"
-            counter += 1
-        self.slug = slug
-        self.save(update_fields=['slug'])
+        save_with_unique_slug(self, base_slug, self.save, update_fields=['slug'])
 
 
 class RestaurantAddress(models.Model):
     restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE)
     address = models.ForeignKey(Address, on_delete=models.CASCADE)
+    # Denormalized from address.city, kept in sync by the Address post_save signal
+    city_key = models.CharField(max_length=100, editable=False, default='')
+    # Denormalized from the address coordinates, kept in sync by orders.geocoding
+    latitude = models.FloatField(blank=True, null=True, editable=False)
+    longitude = models.FloatField(blank=True, null=True, editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = RestaurantAddressQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['city_key', 'restaurant'], name='restaurantaddress_city_idx'),
+            models.Index(fields=['latitude', 'longitude'], name='restaurantaddress_geo_idx'),
+        ]
+
     def __str__(self):
         return f"{self.restaurant.name} - {self.address}"
 
+    def save(self, *args, **kwargs):
+        self.city_key = normalize_city(self.address.city)
+        self.latitude = self.address.latitude
+        self.longitude = self.address.longitude
+        super().save(*args, **kwargs)
+
 
 class Product(models.Model):
     name = models.CharField(max_length=100)
@@ -102,20 +142,19 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='product_created_idx'),
+            models.Index(fields=['restaurant', 'created_at', 'id'], name='product_restaurant_created_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
     def save(self, *args, **kwargs):
-        if not self.slug:
-            base_slug = slugify(self.name)
-            slug = base_slug
-            counter = 1
-
-            while Product.objects.filter(slug=slug).exists():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-            self.slug = slug
-        super().save(*args, **kwargs)
+        if self.slug:
+            return super().save(*args, **kwargs)
+        save_with_unique_slug(self, slugify(self.name), super().save, *args, **kwargs)
 
     def clean(self):
         super().clean()
@@ -138,6 +177,13 @@ class Order(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='created')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_idx'),
+        ]
+
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='products')
@@ -147,5 +193,20 @@ class OrderItem(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = OrderItemQuerySet.as_manager()
+
     def get_total_price(self):
         return self.quantity * self.price
+
+
+class OutboxMessage(models.Model):
+    """Message written in the same transaction as the change it announces, published later by the relay"""
+    queue = models.CharField(max_length=100)
+    payload = models.JSONField()
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
@@ -0,0 +1,67 @@
+import pika
+
+from django.db import transaction
+
+PAYMENT_QUEUE = 'payment_queue'
+# Messages the broker rejected this many times are dead, the relay skips them and they stay for inspection
+MAX_ATTEMPTS = 10
+
+# Broker answers rejecting the message itself, connection and channel errors do not count as attempts
+MESSAGE_ERRORS = (pika.exceptions.NackError, pika.exceptions.UnroutableError)
+
+
+def enqueue_message(queue, payload):
+    """Store a message in the outbox, call it inside the transaction that makes the change."""
+    from .models import OutboxMessage
+
+    return OutboxMessage.objects.create(queue=queue, payload=payload)
+
+
+def enqueue_payment_message(order):
+    return enqueue_message(PAYMENT_QUEUE, {
+        'order_id': order.id,
+        'total_price': float(order.total_price),
+    })
+
+
+def relay_batch(publisher, batch_size=100, max_attempts=MAX_ATTEMPTS):
+    """
+    Publish up to batch_size pending outbox messages in insertion order as persistent messages and delete them.
+    Rows are locked with SKIP LOCKED so several relays can drain the outbox concurrently.
+    Stops at the first message the broker rejects, it is retried on the next batch
+    until it was rejected max_attempts times, then it is skipped so it cannot block the outbox.
+    When the broker can not be reached the messages published so far are deleted and the error
+    is raised without counting an attempt, so the caller can back off.
+    Returns the number of published messages.
+    """
+    from .models import OutboxMessage
+
+    broker_error = None
+    with transaction.atomic():
+        messages = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True)
+            .filter(attempts__lt=max_attempts).order_by('id')[:batch_size]
+        )
+
+        published = []
+        for message in messages:
+            try:
+                publisher.publish(message.queue, message.payload, persistent=True)
+            except MESSAGE_ERRORS as e:
+                OutboxMessage.objects.filter(pk=message.pk).update(attempts=message.attempts + 1, last_error=repr(e))
+                print(f"[!] Outbox message {message.pk} rejected by the broker: {e!r}")
+                if message.attempts + 1 >= max_attempts:
+                    print(f"[!] Outbox message {message.pk} rejected {max_attempts} times, skipping it")
+                break
+            except Exception as e:
+                OutboxMessage.objects.filter(pk=message.pk).update(last_error=repr(e))
+                broker_error = e
+                break
+            published.append(message.pk)
+
+        if published:
+            OutboxMessage.objects.filter(pk__in=published).delete()
+
+    if broker_error is not None:
+        raise broker_error
+    return len(published)
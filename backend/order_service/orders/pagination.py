@@ -0,0 +1,23 @@
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """Keyset pagination over (created_at, id), newest first, without COUNT queries."""
+
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class RankedResultsPagination(BasePagination):
+    """Return the best ranked results (e.g. of a search) in the same envelope as the cursor pagination."""
+
+    page_size = 50
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return list(queryset[:self.page_size])
+
+    def get_paginated_response(self, data):
+        return Response({'next': None, 'previous': None, 'results': data})
@@ -0,0 +1,35 @@
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+
+from .models import Product
+
+
+def price_order_items(restaurant_id, items):
+    """
+    Resolve and price the requested order items with a single query.
+    Returns a list of (product, quantity, price) lines and the order total.
+    """
+    product_ids = {item['product_id'] for item in items}
+
+    products = Product.objects.filter(
+        id__in=product_ids,
+        restaurant_id=restaurant_id,
+    ).only('id', 'price', 'restaurant_id').in_bulk()
+
+    missing = sorted(product_ids - products.keys())
+    if missing:
+        raise ValidationError({
+            'items': [f'Product {product_id} is not available in restaurant {restaurant_id}.' for product_id in missing]
+        })
+
+    lines = []
+    total_price = Decimal('0')
+
+    for item in items:
+        product = products[item['product_id']]
+        quantity = item['quantity']
+        total_price += product.price * quantity
+        lines.append((product, quantity, product.price))
+
+    return lines, total_price
@@ -2,17 +2,33 @@ from rest_framework import serializers
 
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 
 from .models import *
+from .outbox import enqueue_payment_message
+from .pricing import price_order_items
 
 
 # ------------------ Address ------------------
 class AddressSerializer(serializers.ModelSerializer):
     class Meta:
         model = Address
-        fields = ['id', 'country', 'city', 'zip_code', 'street', 'house_number', 'apartment_number']
-        read_only_fields = ['id']
+        fields = [
+            'id', 'country', 'city', 'zip_code', 'street', 'house_number', 'apartment_number',
+            'latitude', 'longitude', 'geocode_confidence',
+        ]
+        read_only_fields = ['id', 'latitude', 'longitude', 'geocode_confidence']
+
+    # Fields the coordinates are geocoded from
+    LOCATION_FIELDS = ('country', 'city', 'zip_code', 'street', 'house_number')
+
+    def update(self, instance, validated_data):
+        if any(field in validated_data and validated_data[field] != getattr(instance, field)
+               for field in self.LOCATION_FIELDS):
+            # Cleared in the same save, the old coordinates must not be served for the new location until it is geocoded
+            instance.latitude = instance.longitude = instance.geocode_confidence = None
+        return super().update(instance, validated_data)
 
 
 # ------------------ User ------------------
@@ -128,13 +144,39 @@ class RestaurantSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'slug']
 
     def get_addresses(self, obj):
-        request = self.context.get('request')
-        city = request.query_params.get('city') if request else None
+        addresses = getattr(obj, 'prefetched_addresses', None)
+
+        if addresses is None:
+            request = self.context.get('request')
+            city = request.query_params.get('city') if request else None
+
+            addresses = obj.restaurantaddress_set.select_related('address')
+            if city:
+                addresses = addresses.filter(city_key=normalize_city(city))
+        return RestaurantAddressSerializer(addresses, many=True).data
 
-        qs = obj.restaurantaddress_set.all()
-        if city:
-            qs = qs.filter(address__city__iexact=city)
-        return RestaurantAddressSerializer(qs, many=True).data
+
+class NearbyRestaurantsQuerySerializer(serializers.Serializer):
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    lng = serializers.FloatField(min_value=-180, max_value=180)
+    radius = serializers.FloatField(min_value=0.1, max_value=50, default=5)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=50)
+
+
+class NearbyRestaurantSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='restaurant.id', read_only=True)
+    name = serializers.CharField(source='restaurant.name', read_only=True)
+    slug = serializers.CharField(source='restaurant.slug', read_only=True)
+    distance_km = serializers.SerializerMethodField()
+    address = AddressSerializer(read_only=True)
+
+    class Meta:
+        model = RestaurantAddress
+        fields = ['id', 'name', 'slug', 'distance_km', 'address']
+        read_only_fields = fields
+
+    def get_distance_km(self, obj):
+        return round(obj.distance_km, 2)
 
 
 # ------------------ PRODUCTS ------------------
@@ -173,6 +215,27 @@ class OrderSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
+class OrderSummarySerializer(serializers.ModelSerializer):
+    restaurant_name = serializers.CharField(source='restaurant.name', read_only=True)
+    item_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ['id', 'restaurant', 'restaurant_name', 'total_price', 'status', 'item_count', 'created_at']
+        read_only_fields = fields
+
+
+class OrderDeliveryContextSerializer(serializers.ModelSerializer):
+    order_id = serializers.IntegerField(source='id', read_only=True)
+    restaurant_address = serializers.JSONField(read_only=True)
+    customer_address = serializers.JSONField(read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ['order_id', 'restaurant', 'user', 'restaurant_address', 'customer_address']
+        read_only_fields = fields
+
+
 class CreateOrderItemSerializer(serializers.Serializer):
     product_id = serializers.IntegerField()
     quantity = serializers.IntegerField(min_value=1)
@@ -182,34 +245,27 @@ class CreateOrderSerializer(serializers.Serializer):
     restaurant_id = serializers.IntegerField()
     items = CreateOrderItemSerializer(many=True)
 
+    def validate(self, attrs):
+        attrs['lines'], attrs['total_price'] = price_order_items(attrs['restaurant_id'], attrs['items'])
+        return attrs
+
     def create(self, validated_data):
         user = self.context['request'].user
         restaurant = get_object_or_404(Restaurant, id=validated_data['restaurant_id'])
 
-        order = Order.objects.create(
-            user=user,
-            restaurant=restaurant,
-            total_price=0
-        )
-
-        total_price = 0
-        order_items = []
-
-        for item in validated_data['items']:
-            product = Product.objects.get(id=item['product_id'])
-            quantity = item['quantity']
-            total_price += product.price * quantity
-
-            order_items.append(OrderItem(
-                order=order,
-                product=product,
-                quantity=quantity,
-                price=product.price
-            ))
+        with transaction.atomic():
+            order = Order.objects.create(
+                user=user,
+                restaurant=restaurant,
+                total_price=validated_data['total_price']
+            )
 
-        OrderItem.objects.bulk_create(order_items)
+            # total_price was computed from these lines already
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=product, quantity=quantity, price=price)
+                for product, quantity, price in validated_data['lines']
+            ], refresh_totals=False)
 
-        order.total_price = total_price
-        order.save()
+            enqueue_payment_message(order)
 
         return order
@@ -1,12 +1,81 @@
-from django.db.models.signals import post_save, post_delete
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-from decimal import Decimal
-from .models import OrderItem
+
+from .cache import bump_menu_version, bump_restaurants_version
+from .models import Address, OrderItem, Product, Restaurant, RestaurantAddress, normalize_city
+from .totals import schedule_total_refresh
 
 
 @receiver(post_save, sender=OrderItem)
 @receiver(post_delete, sender=OrderItem)
-def update_order_total(sender, instance, **kwargs):
-    total = sum(Decimal(item.get_total_price()) for item in instance.order.products.all())
-    instance.order.total_price = total
-    instance.order.save()
+def update_order_total(sender, instance, using, **kwargs):
+    schedule_total_refresh({instance.order_id}, using=using)
+
+
+def _menu_slug(instance):
+    """Slug of the restaurant whose menu shows this restaurant or product"""
+    if isinstance(instance, Restaurant):
+        return instance.slug
+    if Product.restaurant.is_cached(instance):
+        return instance.restaurant.slug
+    return Restaurant.objects.filter(pk=instance.restaurant_id).values_list('slug', flat=True).first()
+
+
+# Fields whose change moves an object to another menu
+MENU_FIELDS = {'slug', 'restaurant', 'restaurant_id'}
+
+
+@receiver(pre_save, sender=Restaurant)
+@receiver(pre_save, sender=Product)
+def remember_menu_slug(sender, instance, update_fields=None, **kwargs):
+    """Remember the menu an existing object belonged to, in case the save moves it"""
+    instance._previous_menu_slug = None
+    if instance.pk is None:
+        return
+    if update_fields is not None and not MENU_FIELDS & set(update_fields):
+        return
+
+    slug_field = 'slug' if sender is Restaurant else 'restaurant__slug'
+    instance._previous_menu_slug = sender.objects.filter(pk=instance.pk).values_list(slug_field, flat=True).first()
+
+
+def _deleted_with_restaurant(origin):
+    """True when a delete cascades from restaurants, whose own post_delete bumps their menus"""
+    return isinstance(origin, Restaurant) or getattr(origin, 'model', None) is Restaurant
+
+
+@receiver(post_save, sender=Restaurant)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Restaurant)
+@receiver(post_delete, sender=Product)
+def invalidate_menu(sender, instance, using, origin=None, **kwargs):
+    if sender is Product and _deleted_with_restaurant(origin):
+        return
+
+    # Bumped once the change is committed, a request racing the commit would cache the old menu under the new version
+    slugs = {getattr(instance, '_previous_menu_slug', None), _menu_slug(instance)}
+    for slug in slugs - {None}:
+        transaction.on_commit(partial(bump_menu_version, slug), using=using)
+
+
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Restaurant)
+@receiver(post_save, sender=RestaurantAddress)
+@receiver(post_delete, sender=RestaurantAddress)
+def invalidate_restaurants(sender, using, **kwargs):
+    transaction.on_commit(bump_restaurants_version, using=using)
+
+
+@receiver(post_save, sender=Address)
+def sync_restaurant_address_city(sender, instance, created, update_fields, **kwargs):
+    previous_city = getattr(instance, '_loaded_city', None)
+    instance._loaded_city = instance.city
+
+    if created or (update_fields is not None and 'city' not in update_fields):
+        return
+    if previous_city is not None and normalize_city(previous_city) == normalize_city(instance.city):
+        return
+    RestaurantAddress.objects.filter(address=instance).update(city_key=normalize_city(instance.city))
@@ -0,0 +1,87 @@
+import re
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+SLUG_SAVE_ATTEMPTS = 5
+
+
+def _taken_suffixes(slugs, base_slug):
+    """Return the numeric suffixes already used for base_slug (0 means the bare slug)."""
+    pattern = re.compile(rf'^{re.escape(base_slug)}(?:-(\d+))?$')
+    taken = set()
+    for slug in slugs:
+        match = pattern.match(slug)
+        if match:
+            taken.add(int(match.group(1) or 0))
+    return taken
+
+
+def _next_free(base_slug, taken):
+    suffix = 0
+    while suffix in taken:
+        suffix += 1
+    taken.add(suffix)
+    return f'{base_slug}-{suffix}' if suffix else base_slug
+
+
+def next_free_slug(model, base_slug, exclude_pk=None):
+    """Find the first free slug for base_slug with a single indexed prefix query."""
+    queryset = model.objects.filter(slug__startswith=base_slug)
+    if exclude_pk is not None:
+        queryset = queryset.exclude(pk=exclude_pk)
+
+    taken = _taken_suffixes(queryset.values_list('slug', flat=True), base_slug)
+    return _next_free(base_slug, taken)
+
+
+def allocate_slugs(model, base_slugs):
+    """
+    Allocate unique slugs for a batch of new objects with a single query.
+    Slugs are unique both against the table and within the batch itself.
+    """
+    base_slugs = [base_slug or model._meta.model_name for base_slug in base_slugs]
+    bases = set(base_slugs)
+    if not bases:
+        return []
+
+    prefixes = Q()
+    for base_slug in bases:
+        prefixes |= Q(slug__startswith=base_slug)
+    existing = list(model.objects.filter(prefixes).values_list('slug', flat=True))
+
+    taken = {base_slug: _taken_suffixes(existing, base_slug) for base_slug in bases}
+    return [_next_free(base_slug, taken[base_slug]) for base_slug in base_slugs]
+
+
+def assign_slugs(instances):
+    """Fill in missing slugs for a batch of unsaved objects, e.g. before bulk_create."""
+    pending = [instance for instance in instances if not instance.slug]
+    if not pending:
+        return instances
+
+    model = type(pending[0])
+    slugs = allocate_slugs(model, [slugify(instance.name) for instance in pending])
+    for instance, slug in zip(pending, slugs):
+        instance.slug = slug
+    return instances
+
+
+def save_with_unique_slug(instance, base_slug, save, *args, **kwargs):
+    """
+    Assign the next free slug and save, retrying with a fresh slug when a
+    concurrent save claims the same one first.
+    """
+    model = type(instance)
+    base_slug = base_slug or model._meta.model_name
+
+    for attempt in range(SLUG_SAVE_ATTEMPTS):
+        instance.slug = next_free_slug(model, base_slug, exclude_pk=instance.pk)
+        try:
+            with transaction.atomic():
+                return save(*args, **kwargs)
+        except IntegrityError:
+            slug_taken = model.objects.filter(slug=instance.slug).exclude(pk=instance.pk).exists()
+            if not slug_taken or attempt == SLUG_SAVE_ATTEMPTS - 1:
+                raise
@@ -0,0 +1,72 @@
+import json
+from unittest.mock import MagicMock
+
+from django.test import TestCase
+
+from order_consumer.consumer import PAYMENT_EXCHANGE, StatusBatch, declare_queues, parse_status_message
+
+from ..models import Order, Restaurant, User
+
+
+class StatusBatchTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='user@example.com', password='password')
+        self.restaurant = Restaurant.objects.create(name='Pizzeria')
+        self.orders = [Order.objects.create(user=self.user, restaurant=self.restaurant) for _ in range(3)]
+
+        self.channel = MagicMock()
+        self.batch = StatusBatch(self.channel, size=10, window=60)
+
+    def add(self, delivery_tag, queue, **data):
+        self.batch.add(delivery_tag, *parse_status_message(queue, json.dumps(data)))
+
+    def test_batch_applied_with_single_update_and_acked(self):
+        self.add(1, 'payment_success', order_id=self.orders[0].id)
+        self.add(2, 'payment_success', order_id=self.orders[1].id)
+        self.add(3, 'delivery_status', order_id=self.orders[0].id, status='in_progress')
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.batch.flush(), 2)
+
+        statuses = dict(Order.objects.values_list('id', 'status'))
+        self.assertEqual(statuses[self.orders[0].id], 'in_progress')
+        self.assertEqual(statuses[self.orders[1].id], 'paid')
+        self.assertEqual(statuses[self.orders[2].id], 'created')
+        self.channel.basic_ack.assert_called_once_with(delivery_tag=3, multiple=True)
+
+    def test_out_of_order_messages_keep_furthest_status(self):
+        self.add(1, 'delivery_status', order_id=self.orders[0].id, status='delivered')
+        self.add(2, 'payment_success', order_id=self.orders[0].id)
+
+        self.batch.flush()
+
+        self.assertEqual(Order.objects.get(id=self.orders[0].id).status, 'delivered')
+
+    def test_batch_due_by_size(self):
+        for tag in range(1, 10):
+            self.add(tag, 'payment_success', order_id=self.orders[0].id)
+        self.assertFalse(self.batch.is_due())
+
+        self.add(10, 'payment_success', order_id=self.orders[0].id)
+        self.assertTrue(self.batch.is_due())
+
+    def test_malformed_messages_acked_without_update(self):
+        self.batch.add(1, *parse_status_message('payment_success', b'not json'))
+        self.add(2, 'delivery_status', order_id=self.orders[0].id, status='teleported')
+
+        with self.assertNumQueries(0):
+            self.batch.flush()
+
+        self.channel.basic_ack.assert_called_once_with(delivery_tag=2, multiple=True)
+        self.assertEqual(Order.objects.get(id=self.orders[0].id).status, 'created')
+
+
+class DeclareQueuesTestCase(TestCase):
+    def test_payment_success_declared_and_bound(self):
+        channel = MagicMock()
+
+        declare_queues(channel)
+
+        channel.queue_declare.assert_any_call(queue="payment_success", durable=True)
+        channel.exchange_declare.assert_called_once_with(exchange=PAYMENT_EXCHANGE, exchange_type="fanout", durable=True)
+        channel.queue_bind.assert_called_once_with(queue="payment_success", exchange=PAYMENT_EXCHANGE)
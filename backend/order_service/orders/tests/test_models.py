@@ -1,6 +1,12 @@
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.db import IntegrityError, connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
 from ..models import *
+from ..slugs import assign_slugs
 
 # Models tests
 
@@ -333,3 +339,154 @@ class OrderProductsTestCase(TestCase):
         )
         expected_total_price = 2 * 20.99
         self.assertEqual(order_products.get_total_price(), expected_total_price)
+
+
+class OrderTotalTestCase(TestCase):
+    """Test case for keeping Order.total_price in sync with its items."""
+    def setUp(self):
+        self.user = User.objects.create(
+            name='Jake',
+            surname='Smith',
+            email='smith@email.com',
+            password='password1',
+            phone_number='1234567890',
+        )
+        self.restaurant = Restaurant.objects.create(name='Restaurant Name')
+        self.product = Product.objects.create(
+            name='Product Name',
+            price=Decimal('20.50'),
+            restaurant=self.restaurant,
+        )
+        self.order = Order.objects.create(user=self.user, restaurant=self.restaurant)
+
+    def add_item(self, quantity=1, price=Decimal('20.50')):
+        return OrderItem(order=self.order, product=self.product, quantity=quantity, price=price)
+
+    def test_total_updated_on_save_and_delete(self):
+        # Test total recalculation for single item writes
+        with self.captureOnCommitCallbacks(execute=True):
+            item = self.add_item(quantity=2)
+            item.save()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_price, Decimal('41.00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            item.delete()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_price, Decimal('0'))
+
+    def test_total_updated_on_bulk_writes(self):
+        # Test total recalculation for bulk_create and queryset update
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderItem.objects.bulk_create([self.add_item(quantity=i) for i in range(1, 4)])
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_price, Decimal('123.00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.products.update(price=Decimal('1.00'))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_price, Decimal('6.00'))
+
+    def test_total_recomputed_once_per_transaction(self):
+        # Test that a multi-item edit recomputes the total with a single statement
+        with self.captureOnCommitCallbacks() as callbacks:
+            for quantity in range(1, 11):
+                self.add_item(quantity=quantity).save()
+
+        with CaptureQueriesContext(connection) as queries:
+            for callback in callbacks:
+                callback()
+
+        self.assertEqual(len(queries), 1)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_price, Decimal('1127.50'))
+
+    def test_bulk_create_without_refresh(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            OrderItem.objects.bulk_create([self.add_item()], refresh_totals=False)
+
+        self.assertEqual(callbacks, [])
+
+    def test_rolled_back_ids_not_refreshed_later(self):
+        other_order = Order.objects.create(user=self.user, restaurant=self.restaurant, total_price=Decimal('99.00'))
+
+        with self.captureOnCommitCallbacks():
+            try:
+                with transaction.atomic():
+                    OrderItem.objects.create(order=other_order, product=self.product, quantity=1, price=Decimal('1.00'))
+                    raise IntegrityError
+            except IntegrityError:
+                pass
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_item(quantity=2).save()
+
+        other_order.refresh_from_db()
+        self.assertEqual(other_order.total_price, Decimal('99.00'))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_price, Decimal('41.00'))
+
+
+class SlugAllocationTestCase(TestCase):
+    """Test case for the slug allocator."""
+    def setUp(self):
+        self.restaurant = Restaurant.objects.create(name='Restaurant Name')
+
+    def create_product(self, name='Pizza'):
+        return Product.objects.create(name=name, price=Decimal('10.00'), restaurant=self.restaurant)
+
+    def test_first_free_suffix_is_used(self):
+        # Test that freed suffixes are reused and similar prefixes are ignored
+        self.create_product('Pizza Hut')
+        first = self.create_product()
+        second = self.create_product()
+        self.create_product()
+        second.delete()
+
+        self.assertEqual(first.slug, 'pizza')
+        self.assertEqual(self.create_product().slug, 'pizza-1')
+
+    def test_slug_allocated_with_constant_queries(self):
+        # Test that the allocation cost does not grow with the number of taken suffixes
+        for _ in range(10):
+            self.create_product()
+
+        with CaptureQueriesContext(connection) as queries:
+            product = self.create_product()
+
+        self.assertEqual(product.slug, 'pizza-10')
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('SELECT')]), 1)
+
+    def test_retry_on_slug_conflict(self):
+        # Test that a slug claimed concurrently is retried instead of failing
+        taken = self.create_product()
+
+        with patch('orders.slugs.next_free_slug', side_effect=[taken.slug, 'pizza-1']):
+            product = self.create_product()
+
+        self.assertEqual(product.slug, 'pizza-1')
+
+    def test_assign_slugs_for_batch(self):
+        # Test slug allocation for a batch of new products
+        self.create_product()
+        products = [
+            Product(name=name, price=Decimal('10.00'), restaurant=self.restaurant)
+            for name in ['Pizza', 'Pizza', 'Pasta']
+        ]
+
+        with CaptureQueriesContext(connection) as queries:
+            assign_slugs(products)
+
+        self.assertEqual(len(queries), 1)
+        self.assertEqual([p.slug for p in products], ['pizza-1', 'pizza-2', 'pasta'])
+
+    def test_update_slug_with_address(self):
+        # Test that the address based slug skips the restaurant itself
+        address = Address.objects.create(city='Poznan', zip_code='12-345', street='Kopernika', house_number='3')
+        Restaurant.objects.create(name='Restaurant Name Kopernika')
+
+        self.restaurant.update_slug_with_address(address)
+        self.restaurant.update_slug_with_address(address)
+
+        self.restaurant.refresh_from_db()
+        self.assertEqual(self.restaurant.slug, 'restaurant-name-kopernika-1')
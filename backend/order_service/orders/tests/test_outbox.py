@@ -0,0 +1,73 @@
+from unittest.mock import MagicMock
+
+import pika
+from django.test import TestCase
+
+from ..models import OutboxMessage
+from ..outbox import enqueue_message, relay_batch
+
+
+class OutboxRelayTestCase(TestCase):
+    def setUp(self):
+        self.messages = [enqueue_message('payment_queue', {'order_id': order_id}) for order_id in range(5)]
+        self.publisher = MagicMock()
+
+    def published_order_ids(self):
+        return [call.args[1]['order_id'] for call in self.publisher.publish.call_args_list]
+
+    def test_relay_publishes_in_order_and_deletes(self):
+        with self.assertNumQueries(4):
+            published = relay_batch(self.publisher, batch_size=3)
+
+        self.assertEqual(published, 3)
+        self.assertEqual(self.published_order_ids(), [0, 1, 2])
+        self.assertEqual(list(OutboxMessage.objects.values_list('payload__order_id', flat=True)), [3, 4])
+
+    def test_relay_drains_remaining_batch(self):
+        relay_batch(self.publisher, batch_size=3)
+        self.assertEqual(relay_batch(self.publisher, batch_size=3), 2)
+        self.assertEqual(relay_batch(self.publisher, batch_size=3), 0)
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_relay_stops_at_rejected_message(self):
+        self.publisher.publish.side_effect = [None, pika.exceptions.NackError([])]
+
+        self.assertEqual(relay_batch(self.publisher), 1)
+
+        failed = OutboxMessage.objects.first()
+        self.assertEqual(failed.pk, self.messages[1].pk)
+        self.assertEqual(failed.attempts, 1)
+        self.assertIn('NackError', failed.last_error)
+        self.assertEqual(OutboxMessage.objects.count(), 4)
+
+    def test_broker_outage_not_counted_as_attempt(self):
+        self.publisher.publish.side_effect = [None, pika.exceptions.AMQPConnectionError('down')]
+
+        with self.assertRaises(pika.exceptions.AMQPConnectionError):
+            relay_batch(self.publisher, max_attempts=1)
+
+        # The published message is deleted, the rest stays pending however long the outage lasts
+        failed = OutboxMessage.objects.first()
+        self.assertEqual(OutboxMessage.objects.count(), 4)
+        self.assertEqual((failed.pk, failed.attempts), (self.messages[1].pk, 0))
+        self.assertIn('down', failed.last_error)
+
+        self.publisher.publish.side_effect = None
+        self.assertEqual(relay_batch(self.publisher, max_attempts=1), 4)
+
+    def test_relay_publishes_persistent_messages(self):
+        relay_batch(self.publisher, batch_size=1)
+        self.publisher.publish.assert_called_once_with('payment_queue', {'order_id': 0}, persistent=True)
+
+    def test_relay_skips_message_after_max_attempts(self):
+        self.publisher.publish.side_effect = pika.exceptions.UnroutableError([])
+        for _ in range(3):
+            self.assertEqual(relay_batch(self.publisher, max_attempts=3), 0)
+
+        self.publisher.publish.side_effect = None
+        self.publisher.publish.reset_mock()
+
+        self.assertEqual(relay_batch(self.publisher, max_attempts=3), 4)
+        self.assertEqual(self.published_order_ids(), [1, 2, 3, 4])
+        dead = OutboxMessage.objects.get()
+        self.assertEqual((dead.pk, dead.attempts), (self.messages[0].pk, 3))
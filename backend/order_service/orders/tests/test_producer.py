@@ -0,0 +1,63 @@
+from unittest.mock import MagicMock, patch
+
+import pika
+from django.test import SimpleTestCase
+
+from order_consumer.producer import Publisher
+
+
+def open_connection():
+    connection = MagicMock(is_closed=False)
+    connection.channel.return_value.is_closed = False
+    return connection
+
+
+@patch('order_consumer.producer.pika.BlockingConnection')
+class PublisherTestCase(SimpleTestCase):
+    def test_connection_and_channel_reused(self, blocking_connection):
+        blocking_connection.return_value = open_connection()
+        publisher = Publisher()
+
+        for order_id in range(3):
+            publisher.publish('payment_queue', {'order_id': order_id})
+
+        blocking_connection.assert_called_once()
+        channel = blocking_connection.return_value.channel.return_value
+        channel.queue_declare.assert_called_once_with(queue='payment_queue', durable=True)
+        self.assertEqual(channel.basic_publish.call_count, 3)
+        self.assertEqual(sum(publisher.stats()['latency'].values()), 3)
+
+    def test_reconnect_after_connection_lost(self, blocking_connection):
+        lost, fresh = open_connection(), open_connection()
+        lost.channel.return_value.basic_publish.side_effect = pika.exceptions.StreamLostError()
+        blocking_connection.side_effect = [lost, fresh]
+
+        Publisher().publish('payment_queue', {'order_id': 1})
+
+        self.assertEqual(blocking_connection.call_count, 2)
+        fresh.channel.return_value.basic_publish.assert_called_once()
+
+    def test_publisher_confirms(self, blocking_connection):
+        Publisher(confirms=True).publish('payment_queue', {'order_id': 1})
+
+        blocking_connection.return_value.channel.return_value.confirm_delivery.assert_called_once()
+
+    def test_error_raised_when_broker_unavailable(self, blocking_connection):
+        blocking_connection.side_effect = pika.exceptions.AMQPConnectionError()
+        publisher = Publisher()
+
+        with self.assertRaises(pika.exceptions.AMQPConnectionError):
+            publisher.publish('payment_queue', {'order_id': 1})
+
+        self.assertEqual(publisher.stats()['errors'], 1)
+
+    def test_idle_connection_serviced(self, blocking_connection):
+        blocking_connection.return_value = open_connection()
+        publisher = Publisher()
+        publisher.process_events()
+        blocking_connection.assert_not_called()
+
+        publisher.publish('payment_queue', {'order_id': 1})
+        publisher.process_events()
+
+        blocking_connection.return_value.process_data_events.assert_called_once_with(time_limit=0)
@@ -0,0 +1,43 @@
+from django.test import TestCase
+
+from ..models import Order, Restaurant, User
+from ..transitions import transition_order, transition_orders
+
+
+class OrderTransitionTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='user@example.com', password='password')
+        self.restaurant = Restaurant.objects.create(name='Pizzeria')
+        self.order = Order.objects.create(user=self.user, restaurant=self.restaurant)
+
+    def status(self, order=None):
+        return Order.objects.values_list('status', flat=True).get(pk=(order or self.order).pk)
+
+    def test_transition_single_query(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(transition_order(self.order.id, 'paid'))
+        self.assertEqual(self.status(), 'paid')
+
+    def test_late_message_does_not_move_order_back(self):
+        transition_order(self.order.id, 'delivered')
+
+        self.assertFalse(transition_order(self.order.id, 'paid'))
+        self.assertFalse(transition_order(self.order.id, 'in_progress'))
+        self.assertEqual(self.status(), 'delivered')
+
+    def test_missing_order(self):
+        self.assertFalse(transition_order(self.order.id + 1, 'paid'))
+
+    def test_unknown_status(self):
+        with self.assertRaises(ValueError):
+            transition_order(self.order.id, 'created')
+
+    def test_bulk_transitions_guarded(self):
+        delivered = Order.objects.create(user=self.user, restaurant=self.restaurant, status='delivered')
+
+        with self.assertNumQueries(1):
+            moved = transition_orders({self.order.id: 'in_progress', delivered.id: 'paid'})
+
+        self.assertEqual(moved, 1)
+        self.assertEqual(self.status(), 'in_progress')
+        self.assertEqual(self.status(delivered), 'delivered')
@@ -1,10 +1,25 @@
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 
-from ..models import Address, UserAddress, Restaurant, RestaurantAddress
+from .. import geocoding
+from ..cache import get_restaurants_version, menu_cache_stats, reset_menu_cache_stats
+from ..models import Address, UserAddress, Restaurant, RestaurantAddress, Product, Order, OrderItem, OutboxMessage
 
 User = get_user_model()
 
@@ -174,7 +189,7 @@ class UserListTestCase(BaseConfig):
         response = self.client.get(self.url)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), User.objects.count())
+        self.assertEqual(len(response.data['results']), User.objects.count())
 
     def test_user_cannot_list_users(self):
         self.authenticate()
@@ -196,7 +211,7 @@ class RestaurantListTestCase(BaseConfig):
     def test_get_public(self):
         response = self.client.get(self.url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
+        self.assertEqual(len(response.data['results']), 2)
 
     def test_create_authenticated(self):
         self.authenticate()
@@ -207,6 +222,43 @@ class RestaurantListTestCase(BaseConfig):
         response = self.client.post(self.url, {'name': 'Restaurant4'})
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
+    def test_search_by_name_prefix(self):
+        Restaurant.objects.create(name='Sushi Palace')
+        Restaurant.objects.create(name='Pizza Palace')
+
+        response = self.client.get(self.url, {'search': 'pal sush'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['name'] for r in response.data['results']], ['Sushi Palace'])
+        self.assertIsNone(response.data['next'])
+
+        response = self.client.get(self.url, {'search': 'palace'})
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_search_without_words_ignored(self):
+        for i in range(3, 8):
+            Restaurant.objects.create(name=f'Restaurant{i}')
+
+        response = self.client.get(self.url, {'search': '!!!', 'page_size': 3})
+
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_cursor_pagination(self):
+        for i in range(3, 8):
+            Restaurant.objects.create(name=f'Restaurant{i}')
+
+        names = []
+        url = f'{self.url}?page_size=3'
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                response = self.client.get(url)
+                names += [restaurant['name'] for restaurant in response.data['results']]
+                url = response.data['next']
+
+        self.assertEqual(names, [f'Restaurant{i}' for i in range(7, 0, -1)])
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+
 
 class RestaurantDetailTestCase(BaseConfig):
     def test_get_public(self):
@@ -238,6 +290,58 @@ class RestaurantDetailTestCase(BaseConfig):
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
 
 
+class RestaurantAddressesQueryTestCase(BaseConfig):
+    def setUp(self):
+        super().setUp()
+
+        for i in range(10):
+            restaurant = Restaurant.objects.create(name=f'Restaurant {i}')
+            for city in ['Warszawa', 'Poznan']:
+                address = Address.objects.create(city=city, zip_code='00-001', street=f'Street {i}', house_number='1')
+                RestaurantAddress.objects.create(restaurant=restaurant, address=address)
+
+    def test_list_query_count(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('restaurant-list'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_list_city_filter_query_count(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('restaurant-list'), {'city': 'warszawa'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 10)
+        for restaurant in response.data['results']:
+            self.assertEqual([a['address']['city'] for a in restaurant['addresses']], ['Warszawa'])
+
+    def test_city_filter_follows_address_update(self):
+        restaurant_address = RestaurantAddress.objects.filter(city_key='poznan').first()
+        restaurant_address.address.city = '  Gdansk '
+        restaurant_address.address.save()
+
+        response = self.client.get(reverse('restaurant-list'), {'city': 'GDANSK'})
+
+        self.assertEqual([r['id'] for r in response.data['results']], [restaurant_address.restaurant_id])
+        self.assertEqual(len(response.data['results'][0]['addresses']), 1)
+
+    def test_address_save_without_city_change_skips_sync(self):
+        address = Address.objects.get(pk=self.address.pk)
+        address.street = 'Nowa'
+
+        with self.assertNumQueries(1):
+            address.save()
+
+    def test_detail_query_count(self):
+        restaurant = Restaurant.objects.get(name='Restaurant 0')
+
+        # One query for the conditional GET validators, two for the restaurant and its addresses
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('restaurant-detail', kwargs={'pk': restaurant.id}))
+
+        self.assertEqual(len(response.data['addresses']), 2)
+
+
 # ------------------ RESTAURANT ADDRESS ------------------
 class RestaurantAddressListTestCase(BaseConfig):
     def setUp(self):
@@ -341,4 +445,483 @@ class RestaurantAddressDetailTestCase(BaseConfig):
 
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertFalse(RestaurantAddress.objects.filter(id=self.restaurant_address.id).exists())
-        self.assertFalse(Address.objects.filter(id=self.address.id).exists())
\ No newline at end of file
+        self.assertFalse(Address.objects.filter(id=self.address.id).exists())
+
+# ------------------ GEOCODING ------------------
+@override_settings(GEOCODING_ASYNC=False, GOOGLE_MAPS_API_KEY='')
+class AddressGeocodingTestCase(BaseConfig):
+    def setUp(self):
+        super().setUp()
+
+        gazetteer = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8')
+        gazetteer.write('kind,name,latitude,longitude\ncity,Poznań,52.4064,16.9252\npostcode,00,52.2297,21.0122\n')
+        gazetteer.close()
+        self.addCleanup(os.remove, gazetteer.name)
+
+        patcher = patch.object(geocoding, '_gazetteer', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.settings_override = override_settings(GEOCODER_GAZETTEER_PATH=gazetteer.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+        self.authenticate()
+
+    def address_data(self, **overrides):
+        return {'city': 'Poznan', 'zip_code': '61-001', 'street': 'Polwiejska', 'house_number': '1', **overrides}
+
+    def test_user_address_geocoded_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(reverse('user-address-list'), self.address_data())
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        address = UserAddress.objects.filter(user=self.user).latest('id').address
+        self.assertIsNone(address.latitude)
+
+        for callback in callbacks:
+            callback()
+
+        address.refresh_from_db()
+        self.assertEqual(address.latitude, Decimal('52.406400'))
+        self.assertEqual(address.longitude, Decimal('16.925200'))
+        self.assertEqual(address.geocode_confidence, geocoding.CITY_CONFIDENCE)
+
+    def test_restaurant_address_postcode_preferred(self):
+        url = reverse('restaurant-address-list', kwargs={'pk': self.restaurant1.id})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, self.address_data(zip_code='00-950'))
+
+        restaurant_address = RestaurantAddress.objects.filter(restaurant=self.restaurant1).latest('id')
+        self.assertEqual(restaurant_address.address.latitude, Decimal('52.229700'))
+        self.assertEqual(restaurant_address.address.geocode_confidence, geocoding.POSTCODE_CONFIDENCE)
+        self.assertEqual(restaurant_address.latitude, 52.2297)
+        self.assertEqual(restaurant_address.longitude, 21.0122)
+
+    def test_restaurant_touched_when_geocoded(self):
+        address = Address.objects.create(**self.address_data())
+        RestaurantAddress.objects.create(restaurant=self.restaurant1, address=address)
+        Restaurant.objects.filter(pk=self.restaurant1.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        updated_at = Restaurant.objects.get(pk=self.restaurant1.pk).updated_at
+        version = get_restaurants_version()
+
+        self.assertTrue(geocoding.geocode_address(address.id))
+
+        self.assertGreater(Restaurant.objects.get(pk=self.restaurant1.pk).updated_at, updated_at)
+        self.assertNotEqual(get_restaurants_version(), version)
+
+    def test_user_address_geocoding_leaves_restaurants(self):
+        address = Address.objects.create(**self.address_data())
+        version = get_restaurants_version()
+
+        geocoding.geocode_address(address.id)
+
+        self.assertEqual(get_restaurants_version(), version)
+
+    def test_unknown_address(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('user-address-list'), self.address_data(city='Springfield', zip_code='12-345'))
+
+        address = UserAddress.objects.filter(user=self.user).latest('id').address
+        self.assertIsNone(address.latitude)
+        self.assertEqual(address.geocode_confidence, 0)
+
+    def test_location_edit_clears_coordinates(self):
+        restaurant_address = RestaurantAddress.objects.create(restaurant=self.restaurant1, address=self.address)
+        geocoding.geocode_address(self.address.id)
+        url = reverse('restaurant-address-detail', kwargs={'pk': self.restaurant1.id, 'address_pk': restaurant_address.id})
+
+        with self.captureOnCommitCallbacks():
+            self.client.patch(url, {'street': 'Nowa'}, format='json')
+
+        self.address.refresh_from_db()
+        restaurant_address.refresh_from_db()
+        self.assertIsNone(self.address.latitude)
+        self.assertIsNone(self.address.geocode_confidence)
+        self.assertIsNone(restaurant_address.latitude)
+
+    def test_apartment_edit_keeps_coordinates(self):
+        geocoding.geocode_address(self.address.id)
+        url = reverse('user-address-detail', kwargs={'pk': self.user_address.id})
+
+        with self.captureOnCommitCallbacks():
+            self.client.patch(url, {'address': {'apartment_number': '5'}}, format='json')
+
+        self.address.refresh_from_db()
+        self.assertEqual(self.address.latitude, Decimal('52.406400'))
+
+    def test_result_for_edited_address_dropped(self):
+        def edit_while_geocoding(address):
+            Address.objects.get(pk=address.pk).save()
+            return 52.4064, 16.9252, geocoding.CITY_CONFIDENCE
+
+        with patch.object(geocoding, 'geocode', side_effect=edit_while_geocoding):
+            self.assertFalse(geocoding.geocode_address(self.address.id))
+
+        self.address.refresh_from_db()
+        self.assertIsNone(self.address.geocode_confidence)
+
+    def test_backfill_command(self):
+        Address.objects.create(**self.address_data())
+        geocoded = Address.objects.create(**self.address_data(city='Springfield', zip_code='12-345'))
+        Address.objects.filter(pk=geocoded.pk).update(geocode_confidence=0)
+        out = StringIO()
+
+        call_command('geocode_addresses', stdout=out)
+
+        self.assertFalse(Address.objects.filter(geocode_confidence__isnull=True).exists())
+        self.assertEqual(Address.objects.get(pk=geocoded.pk).geocode_confidence, 0)
+        self.assertIn('Located 2 of 2 addresses', out.getvalue())
+
+
+# ------------------ NEARBY RESTAURANTS ------------------
+class NearbyRestaurantsTestCase(BaseConfig):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('restaurant-nearby')
+
+        # Points roughly 1, 2 and 3 km east of the searched location and one in Warsaw
+        self.add_address(self.restaurant1, '52.408000', '16.934000')
+        self.add_address(self.restaurant2, '52.408000', '16.964000')
+        self.add_address(self.restaurant2, '52.408000', '16.949000')
+
+        far_restaurant = Restaurant.objects.create(name='Warsaw Restaurant')
+        self.add_address(far_restaurant, '52.229700', '21.012200')
+
+        not_geocoded = Restaurant.objects.create(name='Unknown Restaurant')
+        RestaurantAddress.objects.create(restaurant=not_geocoded, address=Address.objects.create(
+            city='Poznan', zip_code='60-001', street='Nowa', house_number='1',
+        ))
+
+    def add_address(self, restaurant, latitude, longitude):
+        address = Address.objects.create(
+            city='Poznan', zip_code='60-001', street='Rynek', house_number='1',
+            latitude=Decimal(latitude), longitude=Decimal(longitude),
+        )
+        return RestaurantAddress.objects.create(restaurant=restaurant, address=address)
+
+    def test_nearest_first(self):
+        response = self.client.get(self.url, {'lat': 52.408, 'lng': 16.92})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['id'] for row in response.data], [self.restaurant1.id, self.restaurant2.id])
+        self.assertEqual(response.data[0]['distance_km'], 0.95)
+
+    def test_closest_address_per_restaurant(self):
+        response = self.client.get(self.url, {'lat': 52.408, 'lng': 16.92})
+
+        self.assertEqual(response.data[1]['address']['longitude'], '16.949000')
+        self.assertEqual(response.data[1]['distance_km'], 1.97)
+
+    def test_radius(self):
+        response = self.client.get(self.url, {'lat': 52.408, 'lng': 16.92, 'radius': 1.5})
+
+        self.assertEqual([row['id'] for row in response.data], [self.restaurant1.id])
+
+    def test_limit(self):
+        response = self.client.get(self.url, {'lat': 52.408, 'lng': 16.92, 'limit': 1})
+
+        self.assertEqual([row['id'] for row in response.data], [self.restaurant1.id])
+
+    def test_invalid_coordinates(self):
+        response = self.client.get(self.url, {'lat': 95, 'lng': 16.92})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('lat', response.data)
+
+    def test_coordinates_required(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+# ------------------ MENU CACHE ------------------
+class MenuCacheTestCase(BaseConfig):
+    def setUp(self):
+        caches['menu'].clear()
+        reset_menu_cache_stats()
+        super().setUp()
+
+        self.product = Product.objects.create(name='Pizza', price=Decimal('10.00'), restaurant=self.restaurant1)
+        self.menu_url = reverse('restaurant-product-list', kwargs={'slug': self.restaurant1.slug})
+        self.product_url = reverse('product-detail-slug', kwargs={
+            'restaurant_slug': self.restaurant1.slug,
+            'product_slug': self.product.slug,
+        })
+
+    def test_menu_served_from_cache(self):
+        first = self.client.get(self.menu_url)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(self.menu_url)
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first.json()['results'][0]['restaurant_name'], 'Restaurant1')
+        self.assertEqual(menu_cache_stats(), {'hits': 1, 'misses': 1})
+
+    def test_product_save_invalidates_menu(self):
+        self.client.get(self.menu_url)
+        self.client.get(self.product_url)
+
+        self.product.price = Decimal('12.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+
+        self.assertEqual(self.client.get(self.menu_url).json()['results'][0]['price'], '12.00')
+        self.assertEqual(self.client.get(self.product_url).json()['price'], '12.00')
+
+    def test_restaurant_save_invalidates_menu(self):
+        self.client.get(self.menu_url)
+
+        self.restaurant1.name = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.restaurant1.save()
+
+        self.assertEqual(self.client.get(self.menu_url).json()['results'][0]['restaurant_name'], 'Renamed')
+
+    def test_product_delete_invalidates_menu(self):
+        self.client.get(self.menu_url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.delete()
+
+        self.assertEqual(self.client.get(self.menu_url).json()['results'], [])
+        self.assertEqual(self.client.get(self.product_url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_save_without_menu_fields_skips_lookup(self):
+        self.product.price = Decimal('12.00')
+
+        with self.assertNumQueries(1):
+            self.product.save(update_fields=['price'])
+
+    def test_restaurant_delete_bumps_menu_once(self):
+        Product.objects.create(name='Pasta', price=Decimal('11.00'), restaurant=self.restaurant1)
+
+        with patch('orders.signals.bump_menu_version') as bump_menu_version, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.restaurant1.delete()
+
+        bump_menu_version.assert_called_once_with(self.restaurant1.slug)
+
+    def test_menu_bumped_after_commit(self):
+        self.client.get(self.menu_url)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.product.price = Decimal('12.00')
+            self.product.save()
+            # Not committed yet, the menu cached for the current version is still served
+            self.assertEqual(self.client.get(self.menu_url).json()['results'][0]['price'], '10.00')
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.client.get(self.menu_url).json()['results'][0]['price'], '12.00')
+
+    def test_unknown_restaurant_not_cached(self):
+        url = reverse('restaurant-product-list', kwargs={'slug': 'unknown'})
+
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+
+# ------------------ CONDITIONAL GET ------------------
+class ConditionalGetTestCase(BaseConfig):
+    def setUp(self):
+        caches['menu'].clear()
+        super().setUp()
+
+        self.product = Product.objects.create(name='Pizza', price=Decimal('10.00'), restaurant=self.restaurant1)
+
+    def assertNotModified(self, url, response, max_queries):
+        with self.assertNumQueries(max_queries):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(cached.content, b'')
+
+    def test_restaurant_list_not_modified(self):
+        url = reverse('restaurant-list')
+        response = self.client.get(url)
+
+        self.assertNotModified(url, response, max_queries=0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Restaurant.objects.create(name='Restaurant3')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, status.HTTP_200_OK)
+
+    def test_restaurant_list_bumped_after_commit(self):
+        version = get_restaurants_version()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            Restaurant.objects.create(name='Restaurant3')
+            self.assertEqual(get_restaurants_version(), version)
+
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_restaurants_version(), version)
+
+    def test_restaurant_detail_not_modified(self):
+        url = reverse('restaurant-detail', kwargs={'pk': self.restaurant1.id})
+        response = self.client.get(url)
+
+        self.assertIn('Last-Modified', response)
+        self.assertNotModified(url, response, max_queries=1)
+
+        self.authenticate()
+        self.client.post(
+            reverse('restaurant-address-list', kwargs={'pk': self.restaurant1.id}),
+            {'city': 'Gdansk', 'zip_code': '80-001', 'street': 'Dluga', 'house_number': '1'},
+            format='json',
+        )
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, status.HTTP_200_OK)
+
+    def test_menu_not_modified(self):
+        url = reverse('restaurant-product-list', kwargs={'slug': self.restaurant1.slug})
+        response = self.client.get(url)
+
+        self.assertNotModified(url, response, max_queries=0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, status.HTTP_200_OK)
+
+    def test_product_detail_not_modified(self):
+        url = reverse('product-detail-slug', kwargs={
+            'restaurant_slug': self.restaurant1.slug,
+            'product_slug': self.product.slug,
+        })
+        response = self.client.get(url)
+
+        self.assertNotModified(url, response, max_queries=0)
+
+
+# ------------------ ORDERS ------------------
+class UserOrdersListTestCase(BaseConfig):
+    def setUp(self):
+        super().setUp()
+
+        product = Product.objects.create(name='Pizza', price=Decimal('10.00'), restaurant=self.restaurant1)
+        for _ in range(5):
+            order = Order.objects.create(user=self.user, restaurant=self.restaurant1, total_price=Decimal('30.00'))
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=product, quantity=1, price=product.price) for _ in range(3)
+            ])
+        Order.objects.create(user=self.other_user, restaurant=self.restaurant1)
+
+        self.url = reverse('user-orders')
+
+    def test_list_query_count(self):
+        self.authenticate()
+
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertEqual(len(response.data['results'][0]['products']), 3)
+
+    def test_summary(self):
+        self.authenticate()
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'summary': 'true'})
+
+        summary = response.data['results'][0]
+        self.assertEqual(summary['item_count'], 3)
+        self.assertEqual(summary['restaurant_name'], 'Restaurant1')
+        self.assertNotIn('products', summary)
+
+
+class OrderDeliveryContextTestCase(BaseConfig):
+    def setUp(self):
+        super().setUp()
+
+        self.restaurant_address = Address.objects.create(city='Warszawa', zip_code='00-001', street='Marszalkowska', house_number='10')
+        RestaurantAddress.objects.create(restaurant=self.restaurant1, address=self.restaurant_address)
+
+        self.orders = [Order.objects.create(user=self.user, restaurant=self.restaurant1) for _ in range(3)]
+        self.order_without_address = Order.objects.create(user=self.other_user, restaurant=self.restaurant2)
+
+    def test_delivery_context(self):
+        url = reverse('order-delivery-context', kwargs={'pk': self.orders[0].id})
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['order_id'], self.orders[0].id)
+        self.assertEqual(response.data['restaurant_address']['street'], 'Marszalkowska')
+        self.assertEqual(response.data['customer_address']['street'], 'Kopernika')
+        self.assertEqual(response.data['customer_address']['apartment_number'], '4')
+
+    def test_delivery_context_missing_addresses(self):
+        url = reverse('order-delivery-context', kwargs={'pk': self.order_without_address.id})
+        response = self.client.get(url)
+
+        self.assertIsNone(response.data['restaurant_address'])
+        self.assertIsNone(response.data['customer_address'])
+
+    def test_delivery_context_batch(self):
+        ids = [order.id for order in self.orders] + [self.order_without_address.id]
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('order-delivery-context-batch'), {'ids': ','.join(map(str, ids))})
+
+        self.assertEqual([context['order_id'] for context in response.data], ids)
+
+    def test_delivery_context_batch_invalid_ids(self):
+        response = self.client.get(reverse('order-delivery-context-batch'), {'ids': '1,a'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CreateOrderTestCase(BaseConfig):
+    def setUp(self):
+        super().setUp()
+
+        self.products = [
+            Product.objects.create(name=f'Pizza {i}', price=Decimal('10.50'), restaurant=self.restaurant1)
+            for i in range(30)
+        ]
+        self.foreign_product = Product.objects.create(name='Burger', price=Decimal('5.00'), restaurant=self.restaurant2)
+
+        self.url = reverse('create-order')
+
+    def order_data(self, products, quantity=2):
+        return {
+            'restaurant_id': self.restaurant1.id,
+            'items': [{'product_id': product.id, 'quantity': quantity} for product in products],
+        }
+
+    def test_create_order(self):
+        self.authenticate()
+
+        response = self.client.post(self.url, self.order_data(self.products[:2]), format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        order = Order.objects.get(id=response.data['id'])
+        self.assertEqual(order.total_price, Decimal('42.00'))
+        self.assertEqual(order.products.count(), 2)
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.queue, 'payment_queue')
+        self.assertEqual(message.payload, {'order_id': order.id, 'total_price': 42.0})
+
+    def test_reject_product_from_other_restaurant(self):
+        self.authenticate()
+
+        response = self.client.post(self.url, self.order_data([self.products[0], self.foreign_product]), format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('items', response.data)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_query_count_independent_of_basket_size(self):
+        self.authenticate()
+
+        with CaptureQueriesContext(connection) as small_basket:
+            self.client.post(self.url, self.order_data(self.products[:1]), format='json')
+
+        with CaptureQueriesContext(connection) as big_basket:
+            self.client.post(self.url, self.order_data(self.products), format='json')
+
+        self.assertEqual(len(small_basket), len(big_basket))
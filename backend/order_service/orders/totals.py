@@ -0,0 +1,58 @@
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def refresh_order_totals(order_ids, using=None):
+    """Recompute total_price of the given orders with a single UPDATE statement."""
+    from .models import Order, OrderItem
+
+    item_totals = (
+        OrderItem.objects.using(using)
+        .filter(order=OuterRef('pk'))
+        .values('order')
+        .annotate(total=Sum(F('quantity') * F('price')))
+        .values('total')
+    )
+
+    return Order.objects.using(using).filter(pk__in=order_ids).update(
+        total_price=Coalesce(
+            Subquery(item_totals),
+            Value(0),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        )
+    )
+
+
+def schedule_total_refresh(order_ids, using=None):
+    """
+    Recompute the totals of the given orders once the current transaction commits.
+    Orders touched several times in one transaction are recomputed only once.
+    """
+    connection = transaction.get_connection(using)
+
+    pending = getattr(connection, '_pending_order_totals', None)
+    if pending is None or not pending.is_queued(connection):
+        pending = connection._pending_order_totals = _PendingTotals(using)
+        pending.order_ids.update(order_ids)
+        transaction.on_commit(pending.flush, using=using)
+    else:
+        pending.order_ids.update(order_ids)
+
+
+class _PendingTotals:
+    """Order ids waiting for the commit of one transaction on one connection"""
+
+    def __init__(self, using):
+        self.using = using
+        self.order_ids = set()
+        self.flushed = False
+
+    def is_queued(self, connection):
+        # A rolled back transaction drops its on_commit callbacks, and its pending ids with them
+        return not self.flushed and any(callback[1] == self.flush for callback in connection.run_on_commit)
+
+    def flush(self):
+        self.flushed = True
+        if self.order_ids:
+            refresh_order_totals(list(self.order_ids), using=self.using)
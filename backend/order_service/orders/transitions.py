@@ -0,0 +1,56 @@
+from django.db.models import Case, Q, Value, When
+
+# Statuses an order may move to, mapped to the statuses it may move from
+ALLOWED_TRANSITIONS = {
+    'paid': ('created',),
+    'in_progress': ('created', 'paid'),
+    'delivered': ('created', 'paid', 'in_progress'),
+    'cancelled': ('created', 'paid'),
+}
+
+
+def can_follow(previous, status):
+    """Whether an order in status previous may move to status."""
+    return previous in ALLOWED_TRANSITIONS.get(status, ())
+
+
+def _allowed_predecessors(status):
+    try:
+        return ALLOWED_TRANSITIONS[status]
+    except KeyError:
+        raise ValueError(f'Orders can not be moved to status {status!r}')
+
+
+def transition_order(order_id, status):
+    """
+    Move an order to status with one conditional UPDATE.
+    Returns False when the order does not exist or its current status does not allow the move,
+    e.g. a late payment message for an order that is already delivered.
+    """
+    from .models import Order
+
+    return Order.objects.filter(pk=order_id, status__in=_allowed_predecessors(status)).update(status=status) == 1
+
+
+def transition_orders(statuses):
+    """
+    Apply many transitions with a single UPDATE, statuses maps order id to its target status.
+    Returns the number of orders that moved.
+    """
+    from .models import Order
+
+    if not statuses:
+        return 0
+
+    guards = {
+        order_id: Q(pk=order_id, status__in=_allowed_predecessors(status))
+        for order_id, status in statuses.items()
+    }
+
+    allowed = Q()
+    for guard in guards.values():
+        allowed |= guard
+
+    return Order.objects.filter(allowed).update(status=Case(
+        *[When(guards[order_id], then=Value(status)) for order_id, status in statuses.items()]
+    ))
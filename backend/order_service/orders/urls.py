@@ -20,6 +20,7 @@ urlpatterns = [
 
     # Restaurant paths
     path('restaurants/', RestaurantList.as_view(), name='restaurant-list'),
+    path('restaurants/nearby/', NearbyRestaurantList.as_view(), name='restaurant-nearby'),
     path('restaurants/<int:pk>/', RestaurantDetail.as_view(), name='restaurant-detail'),
     path('restaurants/<int:pk>/address/', RestaurantAddressList.as_view(), name='restaurant-address-list'),
     path('restaurants/<int:pk>/addresses/<int:address_pk>/', RestaurantAddressDetail.as_view(), name='restaurant-address-detail'),
@@ -33,6 +34,8 @@ urlpatterns = [
     # Order paths
     path('orders/', UserOrdersList.as_view(), name='user-orders'),
     path('orders/<int:pk>/', OrderDetailView.as_view(), name='order-detail'),
+    path('orders/<int:pk>/delivery-context/', OrderDeliveryContextView.as_view(), name='order-delivery-context'),
+    path('orders/delivery-context/', OrderDeliveryContextBatchView.as_view(), name='order-delivery-context-batch'),
     path('orders/create/', CreateOrderView.as_view(), name='create-order'),
 
 ]
@@ -1,5 +1,8 @@
+from functools import partial
+
 from rest_framework import status
 from rest_framework import generics
+from rest_framework import exceptions
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, IsAuthenticatedOrReadOnly, AllowAny
@@ -8,12 +11,18 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.exceptions import TokenError
 from rest_framework_simplejwt.views import TokenObtainPairView
 
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
 from django_filters.rest_framework import DjangoFilterBackend
 
 from .serializers import *
-from .filters import RestaurantFilter
-
-from order_consumer.producer import send_payment_message
+from .cache import bump_restaurants_version, cached_menu_response, get_menu_version, get_restaurants_version
+from .conditional import ConditionalGetMixin, make_etag
+from .filters import RestaurantFilter, prefix_search_query
+from .geocoding import schedule_geocoding
+from .pagination import CreatedAtCursorPagination, RankedResultsPagination
 
 
 class UserAddressList(generics.ListCreateAPIView):
@@ -38,6 +47,7 @@ class UserAddressList(generics.ListCreateAPIView):
     def perform_create(self, serializer):
         address = serializer.save()
         UserAddress.objects.create(user=self.request.user, address=address)
+        schedule_geocoding(address)
 
 
 class UserAddressDetail(generics.RetrieveUpdateDestroyAPIView):
@@ -57,7 +67,7 @@ class UserAddressDetail(generics.RetrieveUpdateDestroyAPIView):
             partial=True
         )
         address_serializer.is_valid(raise_exception=True)
-        address_serializer.save()
+        schedule_geocoding(address_serializer.save())
 
     def perform_destroy(self, instance):
         instance.address.delete()
@@ -70,6 +80,7 @@ class UserList(generics.ListAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAdminUser]
+    pagination_class = CreatedAtCursorPagination
 
 
 class UserDetail(generics.RetrieveUpdateAPIView):
@@ -137,23 +148,82 @@ class LogoutUserView(APIView):
             return Response({'message': 'Invalid or expired token'}, status=status.HTTP_400_BAD_REQUEST)
 
 
-class RestaurantList(generics.ListCreateAPIView):
+def touch_restaurant(restaurant_id):
+    """Bump updated_at and the listing version so conditional GETs see address changes."""
+    Restaurant.objects.filter(pk=restaurant_id).update(updated_at=timezone.now())
+    bump_restaurants_version()
+
+
+class RestaurantList(ConditionalGetMixin, generics.ListCreateAPIView):
     """List all restaurants or create a new restaurant."""
 
-    queryset = Restaurant.objects.all()
     serializer_class = RestaurantSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = RestaurantFilter
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = CreatedAtCursorPagination
+
+    def get_queryset(self):
+        return Restaurant.objects.with_addresses(city=self.request.query_params.get('city'))
+
+    @property
+    def paginator(self):
+        # Search results are ordered by rank, which cursor pagination cannot page through
+        if not hasattr(self, '_paginator'):
+            # Same test as RestaurantFilter.filter_search, a search without words is ignored there
+            searching = prefix_search_query(self.request.query_params.get('search', '')) is not None
+            self._paginator = RankedResultsPagination() if searching else self.pagination_class()
+        return self._paginator
+
+    def get_etag(self):
+        return make_etag('restaurants', get_restaurants_version())
+
+
+class NearbyRestaurantList(generics.ListAPIView):
+    """Restaurants within ?radius= km (default 5) of ?lat=&lng=, nearest first, up to ?limit= of them."""
+
+    serializer_class = NearbyRestaurantSerializer
+    permission_classes = [AllowAny]
+    pagination_class = None
+
+    def get_queryset(self):
+        query = NearbyRestaurantsQuerySerializer(data=self.request.query_params)
+        query.is_valid(raise_exception=True)
+        self.limit = query.validated_data['limit']
+
+        return RestaurantAddress.objects.nearby(
+            query.validated_data['lat'], query.validated_data['lng'], query.validated_data['radius'],
+        ).select_related('restaurant', 'address')
+
+    def list(self, request, *args, **kwargs):
+        # Addresses come nearest first, so the first one of each restaurant is its closest
+        nearest = {}
+        for restaurant_address in self.get_queryset().iterator(chunk_size=self.limit * 2):
+            nearest.setdefault(restaurant_address.restaurant_id, restaurant_address)
+            if len(nearest) == self.limit:
+                break
+
+        return Response(self.get_serializer(list(nearest.values()), many=True).data)
 
 
-class RestaurantDetail(generics.RetrieveUpdateDestroyAPIView):
+class RestaurantDetail(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update, or delete a restaurant."""
 
-    queryset = Restaurant.objects.all()
     serializer_class = RestaurantSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
+    def get_queryset(self):
+        return Restaurant.objects.with_addresses(city=self.request.query_params.get('city'))
+
+    def get_last_modified(self):
+        if not hasattr(self, '_updated_at'):
+            self._updated_at = Restaurant.objects.filter(pk=self.kwargs['pk']).values_list('updated_at', flat=True).first()
+        return self._updated_at
+
+    def get_etag(self):
+        updated_at = self.get_last_modified()
+        return make_etag('restaurant', self.kwargs['pk'], updated_at) if updated_at else None
+
 
 class RestaurantAddressList(generics.ListCreateAPIView):
     """List all addresses for a restaurant or create a new address."""
@@ -177,6 +247,8 @@ class RestaurantAddressList(generics.ListCreateAPIView):
             restaurant_id=self.kwargs['pk'],
             address=address
         )
+        touch_restaurant(self.kwargs['pk'])
+        schedule_geocoding(address)
 
 
 class RestaurantAddressDetail(generics.RetrieveUpdateDestroyAPIView):
@@ -192,27 +264,42 @@ class RestaurantAddressDetail(generics.RetrieveUpdateDestroyAPIView):
         return get_object_or_404(RestaurantAddress, pk=address_pk)
 
     def perform_update(self, serializer):
-        address = self.get_object().address
-        address_serializer = AddressSerializer(address, data=self.request.data, partial=True)
+        restaurant_address = self.get_object()
+        address_serializer = AddressSerializer(restaurant_address.address, data=self.request.data, partial=True)
         address_serializer.is_valid(raise_exception=True)
-        address_serializer.save()
+        with transaction.atomic():
+            address = address_serializer.save()
+            if address.latitude is None:
+                # The nearby search reads the copied coordinates
+                RestaurantAddress.objects.filter(address=address).update(latitude=None, longitude=None)
+        schedule_geocoding(address)
+        touch_restaurant(restaurant_address.restaurant_id)
 
     def perform_destroy(self, instance):
         instance.address.delete()
         instance.delete()
+        touch_restaurant(instance.restaurant_id)
 
 
-class RestaurantProductList(generics.ListAPIView):
+class RestaurantProductList(ConditionalGetMixin, generics.ListAPIView):
     """List all products for a given restaurant."""
 
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
         restaurant_slug = self.kwargs.get('slug')
         restaurant = get_object_or_404(Restaurant, slug=restaurant_slug)
 
-        return Product.objects.filter(restaurant=restaurant)
+        return Product.objects.filter(restaurant=restaurant).select_related('restaurant')
+
+    def get_etag(self):
+        return make_etag('menu', get_menu_version(self.kwargs.get('slug')))
+
+    def list(self, request, *args, **kwargs):
+        render = partial(super().list, request, *args, **kwargs)
+        return cached_menu_response(request, self.kwargs.get('slug'), render)
 
 
 class ProductList(generics.ListCreateAPIView):
@@ -220,9 +307,10 @@ class ProductList(generics.ListCreateAPIView):
 
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
-        queryset = Product.objects.all()
+        queryset = Product.objects.select_related('restaurant')
         restaurant_id = self.request.query_params.get('restaurant')
 
         if restaurant_id:
@@ -238,7 +326,7 @@ class ProductDetail(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
 
-class ProductDetailBySlug(generics.RetrieveAPIView):
+class ProductDetailBySlug(ConditionalGetMixin, generics.RetrieveAPIView):
     """Retrieve a product by restaurant slug and product slug."""
 
     serializer_class = ProductSerializer
@@ -248,17 +336,36 @@ class ProductDetailBySlug(generics.RetrieveAPIView):
         restaurant_slug = self.kwargs.get('restaurant_slug')
         product_slug = self.kwargs.get('product_slug')
 
-        return get_object_or_404(Product, slug=product_slug, restaurant__slug=restaurant_slug)
+        return get_object_or_404(Product.objects.select_related('restaurant'), slug=product_slug, restaurant__slug=restaurant_slug)
+
+    def get_etag(self):
+        return make_etag('menu', get_menu_version(self.kwargs.get('restaurant_slug')))
+
+    def retrieve(self, request, *args, **kwargs):
+        render = partial(super().retrieve, request, *args, **kwargs)
+        return cached_menu_response(request, self.kwargs.get('restaurant_slug'), render)
 
 
 class UserOrdersList(generics.ListAPIView):
-    """List all orders for the authenticated user."""
+    """List all orders for the authenticated user, or a compact history with ?summary=true."""
 
-    serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
+
+    def is_summary(self):
+        return self.request.query_params.get('summary') in ('1', 'true')
+
+    def get_serializer_class(self):
+        if self.is_summary():
+            return OrderSummarySerializer
+        return OrderSerializer
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        queryset = Order.objects.filter(user=self.request.user)
+
+        if self.is_summary():
+            return queryset.select_related('restaurant').annotate(item_count=Count('products'))
+        return queryset.prefetch_related('products')
 
 
 class OrderDetailView(generics.RetrieveAPIView):
@@ -269,6 +376,34 @@ class OrderDetailView(generics.RetrieveAPIView):
     permission_classes = [AllowAny]
 
 
+class OrderDeliveryContextView(generics.RetrieveAPIView):
+    """Pickup and drop-off addresses of an order - for internal service communication (no auth required)"""
+
+    queryset = Order.objects.with_delivery_context()
+    serializer_class = OrderDeliveryContextSerializer
+    permission_classes = [AllowAny]
+
+
+class OrderDeliveryContextBatchView(generics.ListAPIView):
+    """Pickup and drop-off addresses of many orders (?ids=1,2,3) - for internal service communication"""
+
+    MAX_IDS = 100
+
+    serializer_class = OrderDeliveryContextSerializer
+    permission_classes = [AllowAny]
+
+    def get_queryset(self):
+        try:
+            ids = [int(order_id) for order_id in self.request.query_params.get('ids', '').split(',') if order_id]
+        except ValueError:
+            raise exceptions.ValidationError({'ids': 'Must be a comma separated list of order ids.'})
+
+        if len(ids) > self.MAX_IDS:
+            raise exceptions.ValidationError({'ids': f'At most {self.MAX_IDS} order ids per request.'})
+
+        return Order.objects.filter(id__in=ids).with_delivery_context().order_by('id')
+
+
 class CreateOrderView(generics.CreateAPIView):
     """Create a new order."""
     serializer_class = CreateOrderSerializer
@@ -278,8 +413,7 @@ class CreateOrderView(generics.CreateAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
+        # The payment message is written to the outbox with the order and published by the relay
         order = serializer.save()
 
-        send_payment_message(order.id, order.total_price)
-
         return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
\ No newline at end of file
@@ -0,0 +1,58 @@
+import os
+import threading
+import time
+
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+PAYMENT_GATEWAY = os.environ.get("PAYMENT_GATEWAY", "fake")
+FAKE_GATEWAY_LATENCY = float(os.environ.get("PAYMENT_GATEWAY_LATENCY", "3"))
+# Idempotency keys the fake gateway remembers, the oldest are forgotten first
+FAKE_GATEWAY_MAX_CHARGES = 10000
+
+
+class PaymentGateway(ABC):
+    """Interface of payment providers, charge() is called from worker threads"""
+
+    @abstractmethod
+    def charge(self, order_id, amount, idempotency_key):
+        """
+        Charge amount for the order, return True when the payment succeeded and False when it was declined.
+        Raises when the provider could not be reached, a retry with the same idempotency_key never charges twice.
+        """
+
+
+class FakeGateway(PaymentGateway):
+    """Local gateway which accepts every payment after a simulated provider latency"""
+
+    def __init__(self, latency=FAKE_GATEWAY_LATENCY, max_charges=FAKE_GATEWAY_MAX_CHARGES):
+        self.latency = latency
+        self.max_charges = max_charges
+        # Results by idempotency key, like a provider answering a retried charge
+        self.charges = OrderedDict()
+        self.lock = threading.Lock()
+
+    def charge(self, order_id, amount, idempotency_key):
+        with self.lock:
+            if idempotency_key in self.charges:
+                return self.charges[idempotency_key]
+
+        time.sleep(self.latency)
+
+        with self.lock:
+            result = self.charges.setdefault(idempotency_key, True)
+            while len(self.charges) > self.max_charges:
+                self.charges.popitem(last=False)
+            return result
+
+
+GATEWAYS = {
+    "fake": FakeGateway,
+}
+
+
+def get_gateway(name=PAYMENT_GATEWAY):
+    try:
+        return GATEWAYS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown payment gateway: {name}")
@@ -1,20 +1,104 @@
+import os
 import pika
 import json
 
-from payments.services import process_payment
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
+from payments.gateway import get_gateway
+from payments.services import (
+    ATTEMPTS_HEADER, PAYMENT_DEAD_QUEUE, PAYMENT_RETRY_QUEUE,
+    declare_payment_exchange, declare_payment_retry_queues, process_payment, send_payment_success,
+)
 
-def callback(ch, method, properties, body):
-    try:
-        message = json.loads(body)
-        order_id = message["order_id"]
-        total_price = message["total_price"]
+# Payments processed at the same time, RabbitMQ never delivers more unacked messages than this
+MAX_IN_FLIGHT = int(os.environ.get("PAYMENT_MAX_IN_FLIGHT", "10"))
+# Seconds a payment waits before its charge is retried after a gateway error, and the charges tried in total
+RETRY_DELAY = float(os.environ.get("PAYMENT_RETRY_DELAY", "30"))
+MAX_ATTEMPTS = int(os.environ.get("PAYMENT_MAX_ATTEMPTS", "5"))
+
+
+class PaymentProcessor:
+    """
+    Runs gateway calls on a worker pool while the pika connection stays on its own thread.
+    Workers hand their result back with add_callback_threadsafe, the message is acked
+    once the payment completed and its result was published on the consumer's own channel.
+    A declined payment is acked without a result. After a gateway error the message is moved to the
+    retry queue and charged again after retry_delay seconds, up to max_attempts charges in total,
+    then it is parked in the dead queue.
+    """
 
+    def __init__(self, connection, channel, gateway, max_in_flight=MAX_IN_FLIGHT,
+                 retry_delay=RETRY_DELAY, max_attempts=MAX_ATTEMPTS):
+        self.connection = connection
+        self.channel = channel
+        self.gateway = gateway
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        self.executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="payment")
+
+    def callback(self, ch, method, properties, body):
+        try:
+            message = json.loads(body)
+            order_id = message["order_id"]
+            total_price = message["total_price"]
+        except Exception as e:
+            print(f"[!] Message processing error: {e}")
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            return
+
+        attempts = (properties.headers or {}).get(ATTEMPTS_HEADER, 0)
         print(f"[x] Received message: {message}")
-        process_payment(order_id, total_price)
+        self.executor.submit(self._process, method.delivery_tag, body, attempts, order_id, total_price)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
 
-    except Exception as e:
-        print(f"[!] Message processing error: {e}")
+    def _process(self, delivery_tag, body, attempts, order_id, total_price):
+        """Runs on a worker thread"""
+        try:
+            succeeded = process_payment(self.gateway, order_id, total_price)
+        except Exception as e:
+            print(f"[!] Payment for order {order_id} failed: {e}")
+            complete = partial(self._retry, delivery_tag, body, attempts + 1, order_id)
+        else:
+            complete = partial(self._complete, delivery_tag, order_id, succeeded)
+
+        try:
+            self.connection.add_callback_threadsafe(complete)
+        except Exception as e:
+            # The connection was lost, the unacked message will be redelivered
+            print(f"[!] Could not complete payment for order {order_id}: {e}")
+
+    def _complete(self, delivery_tag, order_id, succeeded):
+        """Runs on the connection thread"""
+        if succeeded:
+            send_payment_success(self.channel, order_id)
+        self.channel.basic_ack(delivery_tag=delivery_tag)
+
+    def _retry(self, delivery_tag, body, attempts, order_id):
+        """
+        Runs on the connection thread. The charge is retried with the same idempotency key,
+        the original message is acked once its retry (or dead) copy was published.
+        """
+        if attempts >= self.max_attempts:
+            print(f"[!] Payment for order {order_id} failed {attempts} times, moving it to '{PAYMENT_DEAD_QUEUE}'")
+            queue, expiration = PAYMENT_DEAD_QUEUE, None
+        else:
+            print(f"[*] Retrying payment for order {order_id} in {self.retry_delay:g} seconds")
+            queue, expiration = PAYMENT_RETRY_QUEUE, str(int(self.retry_delay * 1000))
+
+        self.channel.basic_publish(
+            exchange="",
+            routing_key=queue,
+            body=body,
+            properties=pika.BasicProperties(
+                delivery_mode=2,  # Make message persistent
+                headers={ATTEMPTS_HEADER: attempts},
+                expiration=expiration,
+            )
+        )
+        self.channel.basic_ack(delivery_tag=delivery_tag)
 
 
 def start_consumer():
@@ -25,14 +109,21 @@ def start_consumer():
     )
     channel = connection.channel()
 
-    channel.queue_declare(queue="payment_queue")
+    channel.queue_declare(queue="payment_queue", durable=True)
+    declare_payment_exchange(channel)
+    declare_payment_retry_queues(channel)
+    channel.basic_qos(prefetch_count=MAX_IN_FLIGHT)
+
+    processor = PaymentProcessor(connection, channel, get_gateway())
 
-    print("[*] Listening on 'payment_queue'...")
+    print(f"[*] Listening on 'payment_queue' with up to {MAX_IN_FLIGHT} payments in flight...")
 
     channel.basic_consume(
         queue="payment_queue",
-        on_message_callback=callback,
-        auto_ack=True
+        on_message_callback=processor.callback
     )
 
-    channel.start_consuming()
+    try:
+        channel.start_consuming()
+    finally:
+        processor.close()
@@ -1,56 +1,58 @@
-import time
 import pika
 import json
 
+PAYMENT_EXCHANGE = "payment_events"
 
-def process_payment(order_id, total_price):
+# Failed payments wait in PAYMENT_RETRY_QUEUE until their message expires and RabbitMQ dead-letters
+# them back to payment_queue, payments out of attempts are parked in PAYMENT_DEAD_QUEUE
+PAYMENT_RETRY_QUEUE = "payment_retry"
+PAYMENT_DEAD_QUEUE = "payment_dead"
+ATTEMPTS_HEADER = "x-payment-attempts"
+
+
+def process_payment(gateway, order_id, total_price):
+    """Charge the order through the gateway, return True when the payment succeeded and False when it was declined"""
     print(f"[x] Processing payment for order {order_id}")
-    time.sleep(3)
+
+    # The order id keeps a redelivered payment message from charging the customer twice
+    if not gateway.charge(order_id, total_price, idempotency_key=str(order_id)):
+        print(f"[!] Payment for order {order_id} was declined")
+        return False
+
     print(f"[✓] Payment for order {order_id} succeeded")
+    return True
 
-    send_payment_success(order_id)
 
+def declare_payment_exchange(channel):
+    """Declare the fanout exchange payment results are published to, subscribers declare and bind their own queues"""
+    channel.exchange_declare(exchange=PAYMENT_EXCHANGE, exchange_type="fanout", durable=True)
 
-def send_payment_success(order_id):
-    """Send payment success to both order service and delivery service"""
-    connection = pika.BlockingConnection(
-        pika.ConnectionParameters(host="rabbitmq", port=5672)
-    )
-    channel = connection.channel()
 
-    # Queue for order service
-    channel.queue_declare(queue="payment_success")
-    
-    # Queue for delivery service
-    channel.queue_declare(queue="delivery_queue", durable=True)
+def declare_payment_retry_queues(channel):
+    """Declare the retry queue dead-lettering expired messages back to payment_queue, and the dead queue"""
+    channel.queue_declare(queue=PAYMENT_RETRY_QUEUE, durable=True, arguments={
+        "x-dead-letter-exchange": "",
+        "x-dead-letter-routing-key": "payment_queue",
+    })
+    channel.queue_declare(queue=PAYMENT_DEAD_QUEUE, durable=True)
+
 
-    # Message for order service (simple)
-    order_message = {
+def send_payment_success(channel, order_id):
+    """
+    Publish a payment success once to the payment exchange, using the caller's channel.
+    The order service (payment_success) and delivery service (delivery_queue) both receive it.
+    """
+    message = {
         "order_id": order_id,
         "status": "paid"
     }
-    
-    channel.basic_publish(
-        exchange="",
-        routing_key="payment_success",
-        body=json.dumps(order_message)
-    )
-    print(f"[+] Sent payment_success to order service for order {order_id}")
-    
-    # Message for delivery service (only order_id - delivery will fetch details from order service)
-    delivery_message = {
-        "order_id": order_id
-    }
-    
+
     channel.basic_publish(
-        exchange="",
-        routing_key="delivery_queue",
-        body=json.dumps(delivery_message),
+        exchange=PAYMENT_EXCHANGE,
+        routing_key="",
+        body=json.dumps(message),
         properties=pika.BasicProperties(
             delivery_mode=2,  # Make message persistent
         )
     )
-    print(f"[+] Sent delivery request for order {order_id}")
-
-    connection.close()
-
+    print(f"[+] Published payment success for order {order_id}")
@@ -0,0 +1,121 @@
+import json
+
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from payments.gateway import FakeGateway, PaymentGateway
+from payments.processor import PaymentProcessor
+from payments.services import (
+    ATTEMPTS_HEADER, PAYMENT_DEAD_QUEUE, PAYMENT_EXCHANGE, PAYMENT_RETRY_QUEUE, declare_payment_exchange,
+)
+
+
+class DecliningGateway(PaymentGateway):
+    def charge(self, order_id, amount, idempotency_key):
+        return False
+
+
+class FailingGateway(PaymentGateway):
+    def charge(self, order_id, amount, idempotency_key):
+        raise ConnectionError("gateway unreachable")
+
+
+class PaymentProcessorTestCase(TestCase):
+    def setUp(self):
+        self.connection = MagicMock()
+        # Run the completion inline instead of on the connection thread
+        self.connection.add_callback_threadsafe.side_effect = lambda callback: callback()
+        self.channel = MagicMock()
+
+    def process(self, gateway, order_id=7, attempts=0):
+        processor = PaymentProcessor(self.connection, self.channel, gateway, max_in_flight=1, retry_delay=30, max_attempts=3)
+        body = json.dumps({"order_id": order_id, "total_price": 25.0})
+        processor._process(delivery_tag=1, body=body, attempts=attempts, order_id=order_id, total_price=25.0)
+        processor.close()
+
+    # ------------------ FakeGateway ------------------
+    def test_successful_payment_published_and_acked(self):
+        self.process(FakeGateway(latency=0))
+
+        self.channel.basic_publish.assert_called_once()
+        publish = self.channel.basic_publish.call_args.kwargs
+        self.assertEqual(publish["exchange"], PAYMENT_EXCHANGE)
+        self.assertEqual(json.loads(publish["body"]), {"order_id": 7, "status": "paid"})
+        self.channel.basic_ack.assert_called_once_with(delivery_tag=1)
+        self.channel.basic_nack.assert_not_called()
+
+    def test_fake_gateway_repeats_result_for_same_key(self):
+        gateway = FakeGateway(latency=0)
+
+        self.assertTrue(gateway.charge(7, 25.0, idempotency_key="7"))
+        self.assertTrue(gateway.charge(7, 25.0, idempotency_key="7"))
+        self.assertEqual(gateway.charges, {"7": True})
+
+    def test_fake_gateway_forgets_oldest_keys(self):
+        gateway = FakeGateway(latency=0, max_charges=2)
+
+        for order_id in range(4):
+            gateway.charge(order_id, 25.0, idempotency_key=str(order_id))
+
+        self.assertEqual(list(gateway.charges), ["2", "3"])
+
+    def test_order_id_used_as_idempotency_key(self):
+        gateway = MagicMock(spec=PaymentGateway)
+        gateway.charge.return_value = True
+
+        self.process(gateway, order_id=42)
+
+        gateway.charge.assert_called_once_with(42, 25.0, idempotency_key="42")
+
+    # ------------------ Declines ------------------
+    def test_declined_payment_acked_without_result(self):
+        self.process(DecliningGateway())
+
+        self.channel.basic_publish.assert_not_called()
+        self.channel.basic_ack.assert_called_once_with(delivery_tag=1)
+        self.channel.basic_nack.assert_not_called()
+
+    # ------------------ Gateway errors ------------------
+    def test_gateway_error_retried_after_delay(self):
+        self.process(FailingGateway())
+
+        publish = self.channel.basic_publish.call_args.kwargs
+        self.assertEqual(publish["routing_key"], PAYMENT_RETRY_QUEUE)
+        self.assertEqual(json.loads(publish["body"]), {"order_id": 7, "total_price": 25.0})
+        self.assertEqual(publish["properties"].headers, {ATTEMPTS_HEADER: 1})
+        self.assertEqual(publish["properties"].expiration, "30000")
+        self.channel.basic_ack.assert_called_once_with(delivery_tag=1)
+        self.channel.basic_nack.assert_not_called()
+
+    def test_exhausted_payment_dead_lettered(self):
+        self.process(FailingGateway(), attempts=2)
+
+        publish = self.channel.basic_publish.call_args.kwargs
+        self.assertEqual(publish["routing_key"], PAYMENT_DEAD_QUEUE)
+        self.assertEqual(publish["properties"].headers, {ATTEMPTS_HEADER: 3})
+        self.assertIsNone(publish["properties"].expiration)
+        self.channel.basic_ack.assert_called_once_with(delivery_tag=1)
+
+    def test_attempts_read_from_headers(self):
+        processor = PaymentProcessor(self.connection, self.channel, FakeGateway(latency=0), max_in_flight=1)
+        processor.executor = MagicMock()
+        body = json.dumps({"order_id": 7, "total_price": 25.0})
+
+        processor.callback(self.channel, MagicMock(delivery_tag=1), MagicMock(headers={ATTEMPTS_HEADER: 2}), body)
+
+        processor.executor.submit.assert_called_once_with(processor._process, 1, body, 2, 7, 25.0)
+
+    def test_gateway_interface_is_abstract(self):
+        with self.assertRaises(TypeError):
+            PaymentGateway()
+
+
+class DeclarePaymentExchangeTestCase(TestCase):
+    def test_only_exchange_declared(self):
+        channel = MagicMock()
+
+        declare_payment_exchange(channel)
+
+        channel.exchange_declare.assert_called_once_with(exchange=PAYMENT_EXCHANGE, exchange_type="fanout", durable=True)
+        channel.queue_declare.assert_not_called()
+        channel.queue_bind.assert_not_called()